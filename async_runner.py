@@ -0,0 +1,493 @@
+import asyncio
+import json
+import time
+from bioblend import ConnectionError
+from dataset_modification import DatasetModification
+from dataset_state_tracker import DatasetStateTracker
+from job_watcher import JobSetWatcher
+from pprint import pprint
+from urllib.parse import urlsplit
+from xml_parser import XMLParser
+from typing import (
+    Any,
+    Dict,
+    List,
+    Set
+)
+
+try:
+    import aiohttp
+except ImportError:  # Only needed by --async
+    aiohttp = None
+
+
+class AsyncGalaxyClient:
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        max_connections: int = 16,
+        timeout: float = 60.0,
+        post_timeout: float | None = None,
+        metrics=None
+    ):
+        """
+        Initialize the AsyncGalaxyClient class.
+
+        A minimal Galaxy API client on aiohttp, for the requests the async runner sends many of.
+        Errors are raised as bioblend ConnectionError, like the ones of the synchronous client.
+
+        Args:
+            url (str): The API URL of the Galaxy server, e.g. https://usegalaxy.eu/api.
+            api_key (str): The API key.
+            max_connections (int): Maximum number of open connections.
+            timeout (float): Seconds a GET request may take.
+            post_timeout (float | None): Seconds a POST request may take, None for no limit, as Galaxy may
+                still create the job of a submission the client gave up on.
+            metrics: HttpTransport the requests are counted in, None to not count them.
+        """
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.post_timeout = post_timeout
+        self.metrics = metrics
+        self.session = None
+
+    async def __aenter__(self):
+        if aiohttp is None:
+            raise RuntimeError("The async runner needs aiohttp, install it with 'pip install aiohttp'")
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"x-api-key": self.api_key}
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def request(self, method: str, path: str, params: Any = None, payload: Any = None) -> bytes:
+        """
+        Send a request and return the body of the response.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path below the API URL, or a full URL.
+            params: The query parameters, a list value repeats its parameter.
+            payload: The JSON payload.
+
+        Returns:
+            bytes: The body.
+
+        Raises:
+            ConnectionError: If the server cannot be reached or does not answer with status 200.
+        """
+        url = path if "://" in path else f"{self.url}/{path.lstrip('/')}"
+        if isinstance(params, dict):
+            # aiohttp repeats a parameter given as several pairs, not as a list
+            params = [
+                (key, item) for key, value in params.items() for item in (value if isinstance(value, list) else [value])
+            ]
+        options = {}
+        if method not in ("GET", "HEAD"):
+            # Only idempotent requests use the timeout of the session
+            options["timeout"] = aiohttp.ClientTimeout(total=self.post_timeout)
+        start = time.monotonic()
+        try:
+            async with self.session.request(method, url, params=params, json=payload, **options) as response:
+                body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.record(url, start, failed=True)
+            raise ConnectionError(f"Failed to reach {url}: {e!r}")
+        self.record(url, start, failed=response.status >= 500)
+
+        if response.status != 200:
+            raise ConnectionError(
+                f"Unexpected HTTP status code: {response.status}",
+                body=body.decode(errors="replace"),
+                status_code=response.status
+            )
+        return body
+
+    def record(self, url: str, start: float, failed: bool):
+        # Async requests show up in the same per-host metrics as the pooled ones
+        if self.metrics is not None:
+            self.metrics.record(urlsplit(url).netloc, time.monotonic() - start, failed=failed)
+
+    async def get(self, path: str, params: Any = None) -> Any:
+        """
+        Send a GET request and decode the JSON response.
+
+        Args:
+            path (str): The path below the API URL.
+            params: The query parameters.
+
+        Returns:
+            Any: The decoded response.
+        """
+        return json.loads(await self.request("GET", path, params=params))
+
+    async def post(self, path: str, payload: Dict) -> Any:
+        """
+        Send a POST request with a JSON payload and decode the JSON response.
+
+        Args:
+            path (str): The path below the API URL.
+            payload (dict): The JSON payload.
+
+        Returns:
+            Any: The decoded response.
+        """
+        return json.loads(await self.request("POST", path, payload=payload))
+
+
+class AsyncWorkflowRunner:
+    def __init__(
+        self,
+        workflow,
+        client: AsyncGalaxyClient,
+        max_submissions: int = 4,
+        max_queued: int = 32,
+        poll_interval: float = 5.0
+    ):
+        """
+        Initialize the AsyncWorkflowRunner class.
+
+        Runs the tool probing of check_state_workflow() as tasks on one event loop: dataset polling,
+        tool source downloads, combination submissions and job watching wait for the server without
+        holding a thread each. The records of the runs are kept by the GalaxyWorkflow, as in the
+        threaded runner. Cancelling the run cancels every task of it.
+
+        Args:
+            workflow (GalaxyWorkflow): The workflow holding the history, the sampler and the records.
+            client (AsyncGalaxyClient): The open async API client.
+            max_submissions (int): Maximum number of combinations submitted at the same time.
+            max_queued (int): Maximum number of generated combinations waiting for submission.
+            poll_interval (float): Seconds between two polls of the workflow datasets.
+        """
+        self.workflow = workflow
+        self.client = client
+        self.submission_slots = asyncio.Semaphore(max_submissions)
+        self.queue_slots = asyncio.Semaphore(max_queued)
+        self.poll_interval = poll_interval
+
+    async def run(self, input_list: List[str]):
+        """
+        Check the state of the workflow datasets and probe the tool of every finished dataset.
+
+        Args:
+            input_list (list): List of dataset IDs.
+
+        Returns:
+            None
+        """
+        workflow = self.workflow
+        if workflow.results is not None:
+            workflow.results.start_run(
+                server=workflow.server, galaxy_version=await self.get_galaxy_version(), sampling=workflow.sampler.strategy
+            )
+
+        if workflow.checkpoint is not None:
+            workflow.checkpoint.record_datasets(history_id=workflow.history_id, dataset_ids=input_list)
+
+        tracker = DatasetStateTracker(gi=None, history_id=workflow.history_id, dataset_ids=input_list)
+        try:
+            # Leaving the task group waits for every tool, cancelling it cancels them all
+            async with asyncio.TaskGroup() as tool_tasks:
+                await self.track_datasets(tracker, tool_tasks)
+        except asyncio.CancelledError:
+            print("Cancelled the pending runs")
+            if workflow.results is not None:
+                workflow.results.finish_run()
+            raise
+
+        pprint("Finished")
+        workflow.export_errors()
+        if workflow.results is not None:
+            workflow.results.finish_run()
+        workflow.print_sampling_summary()
+
+    async def get_galaxy_version(self) -> str | None:
+        """
+        Return the version of the Galaxy server.
+
+        Returns:
+            str | None: The major version, None if the server could not be reached.
+        """
+        try:
+            return (await self.client.get("version")).get("version_major")
+        except ConnectionError as e:
+            print(f"Failed to get the Galaxy version: {e}")
+            return None
+
+    async def track_datasets(self, tracker: DatasetStateTracker, tool_tasks: asyncio.TaskGroup):
+        """
+        Poll the tracked datasets until all of them finished and probe the tool of every 'ok' dataset.
+
+        Args:
+            tracker (DatasetStateTracker): The tracker holding the datasets of the workflow.
+            tool_tasks (asyncio.TaskGroup): The task group the tool runs are started in.
+
+        Returns:
+            None
+        """
+        while tracker.pending:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                pprint(f"Current Length: {len(tracker.pending)}")
+                items = []
+                async with self.workflow.health.async_slot():
+                    for params in tracker.build_params():
+                        items += await self.client.get(f"histories/{tracker.history_id}/contents", params=params)
+                # Only datasets which just changed into a finished state are processed
+                for item, previous_state in tracker.update(tracker.index_items(items)):
+                    if item["state"] != "ok":
+                        print(f"Dataset {item['id']} changed from {previous_state} to {item['state']}")
+                        continue
+                    tool_tasks.create_task(self.probe_dataset(item))
+            except ConnectionError as e:
+                print(f"Failed to connect to Galaxy: {e}")
+                await asyncio.sleep(2)
+            finally:
+                print("Round", len(tracker.pending))
+
+    async def probe_dataset(self, item: Dict):
+        """
+        Read the tool which created a dataset and run its combinations if it has data table backed params.
+
+        Every tool is probed only once, for the first of its datasets.
+
+        Args:
+            item (dict): The history item of the dataset.
+
+        Returns:
+            None
+        """
+        workflow = self.workflow
+        try:
+            if item["type"] != "file":
+                return
+            details = await self.client.get(
+                f"histories/{workflow.history_id}/contents/{item['id']}/provenance", params={"follow": "false"}
+            )
+            tool_id, tool_input = DatasetModification(gi=None, history_id=workflow.history_id).read_provenance(details)
+            if tool_id in workflow.my_dict:
+                return
+            workflow.my_dict[tool_id] = tool_input
+
+            # The tool metadata is one cached request per tool
+            metadata = await asyncio.to_thread(workflow.tool_metadata.get, tool_id)
+            pprint(metadata.name)
+            pprint(metadata.link)
+            xml_parser = XMLParser()
+            xml_parser.fetch_xml_data(xml_content=await self.fetch_tool_source(tool_id, metadata))
+
+            if xml_parser.data_table_params:
+                await self.run_tool(xml_parser, tool_id, tool_input, metadata.name)
+        except Exception as e:
+            # One failing tool does not stop the others
+            print(f"Tool run failed: {e!r}")
+
+    async def fetch_tool_source(self, tool_id: str, metadata) -> bytes:
+        """
+        Return the raw source of a tool, from the tool source cache if it holds the version.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            metadata (ToolMetadata): The metadata of the tool.
+
+        Returns:
+            bytes: The tool source.
+        """
+        cache = self.workflow.tool_source_cache
+        if cache is not None:
+            source = cache.get_stored(tool_id=tool_id, version=metadata.version)
+            if source is not None:
+                return source
+
+        source = await self.client.request("GET", metadata.link)
+        if cache is not None:
+            cache.store(cache.get_key(tool_id, metadata.version), source, etag=None, last_modified=None)
+        return source
+
+    async def run_tool(self, xml_parser: XMLParser, tool_id: str, tool_input, tool_name: str):
+        """
+        Submit the selected combinations of a tool and record the jobs as they finish.
+
+        Combinations are generated lazily and wait for a free queue slot, the jobs are watched while
+        the submissions are still running.
+
+        Args:
+            xml_parser (XMLParser): The parser holding the data table backed params of the tool source.
+            tool_id (str): The ID of the tool to be executed.
+            tool_input: The initial tool input.
+            tool_name (str): The name of the tool.
+
+        Returns:
+            None
+        """
+        workflow = self.workflow
+        history_id = workflow.history_id
+        if workflow.shard_histories:
+            # Creating the scratch history and copying the inputs are a few one-off requests
+            history_id = await asyncio.to_thread(workflow.history_shards.get_history, tool_name, workflow.resume)
+            tool_input = await asyncio.to_thread(workflow.history_shards.copy_inputs, history_id, tool_input)
+            print(f'Running {tool_name} in history {workflow.history_shards.get_name(tool_name)}')
+
+        tool_run = await asyncio.to_thread(workflow.plan_tool_run, xml_parser, tool_id, tool_input, tool_name)
+        if tool_run is None:
+            return
+
+        watcher = JobSetWatcher(gi=None, history_id=history_id, deadline=workflow.scheduler.deadline)
+        selected_combinations = 0
+        resumed_combinations = 0
+        submissions: Set[asyncio.Task] = set()
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(self.watch_jobs(watcher, tool_run))
+            for combination, inp, updated_input in tool_run["tool_inputs"]:
+                selected_combinations += 1
+                if workflow.resume_combination(watcher=watcher, tool_id=tool_id, entry=updated_input):
+                    resumed_combinations += 1
+                    continue
+                await self.queue_slots.acquire()
+                submission = tasks.create_task(
+                    self.submit_combination(watcher, tool_run, inp, updated_input, combination, history_id)
+                )
+                submission.add_done_callback(lambda _: self.queue_slots.release())
+                submission.add_done_callback(submissions.discard)
+                submissions.add(submission)
+
+            await asyncio.to_thread(workflow.record_sampling_summary, tool_name, tool_run["total"], selected_combinations)
+            if resumed_combinations:
+                print(f'{resumed_combinations} combinations of {tool_name} taken over from the interrupted run')
+
+            # Stop watching once the last submission returned and its job settled
+            await asyncio.gather(*submissions)
+            watcher.close()
+
+        await asyncio.to_thread(workflow.finish_tool_run, tool_run, selected_combinations)
+
+    async def submit_combination(
+        self,
+        watcher: JobSetWatcher,
+        tool_run: Dict,
+        tool_inputs: Dict,
+        entry: Dict,
+        combination: Dict,
+        history_id: str
+    ):
+        """
+        Run a tool with one combination of inputs and add the job to the watcher.
+
+        Args:
+            watcher (JobSetWatcher): The watcher holding the pending jobs of the tool.
+            tool_run (dict): The tool run, as returned by plan_tool_run().
+            tool_inputs (dict): The inputs submitted to Galaxy.
+            entry (dict): The inputs recorded if the combination fails.
+            combination (dict): The database values of the combination.
+            history_id (str): The history the job runs in.
+
+        Returns:
+            None
+        """
+        payload = {
+            "history_id": history_id,
+            "tool_id": tool_run["tool_id"],
+            "inputs": tool_inputs,
+            "input_format": "21.01"
+        }
+        async with self.submission_slots, self.workflow.health.async_slot():
+            try:
+                job = await self.client.post("tools", payload=payload)
+                job_id = job["jobs"][0]["id"]
+            except Exception as e:
+                await asyncio.to_thread(
+                    self.workflow.record_submission_error,
+                    tool_run["tool_name"], entry, str(e), combination, tool_run["tool_row"], tool_run
+                )
+                return
+        # The records are written to the results database and the journals, off the event loop
+        await asyncio.to_thread(
+            self.workflow.record_submission, tool_run["tool_id"], entry, job_id, combination, tool_run["tool_row"]
+        )
+        watcher.add(job_id, entry)
+
+    async def watch_jobs(self, watcher: JobSetWatcher, tool_run: Dict):
+        """
+        Record every job of a tool as soon as it reached a terminal state.
+
+        The rounds are the ones of JobSetWatcher.watch(), only waiting between them does not hold a thread.
+
+        Args:
+            watcher (JobSetWatcher): The watcher holding the pending jobs of the tool.
+            tool_run (dict): The tool run, as returned by plan_tool_run().
+
+        Returns:
+            None
+        """
+        while True:
+            if not watcher.pending:
+                if watcher.closed:
+                    return
+                # Nothing to watch until the next submission returned
+                await asyncio.sleep(watcher.backoff.initial)
+                continue
+
+            expired = watcher.expire()
+            if expired:
+                await self.record_job_states(tool_run, expired)
+                continue
+
+            try:
+                async with self.workflow.health.async_slot():
+                    finished = await self.fetch_terminal_jobs(watcher)
+            except ConnectionError as e:
+                print(f"Failed to connect to Galaxy while watching jobs: {e}")
+                finished = []
+
+            await self.record_job_states(tool_run, watcher.settle(finished))
+            if watcher.pending:
+                await asyncio.sleep(watcher.backoff.next_delay())
+
+    async def record_job_states(self, tool_run: Dict, settled: List[tuple]):
+        """
+        Record the final states of a round of jobs on a worker thread.
+
+        The records are written to the results database, the checkpoint and the error logs, which
+        would otherwise hold up every poll and submission of the event loop.
+
+        Args:
+            tool_run (dict): The tool run, as returned by plan_tool_run().
+            settled (list): The job ID, the final state and the entry of every job.
+
+        Returns:
+            None
+        """
+        def record():
+            for job_id, completion_status, entry in settled:
+                self.workflow.record_job_state(tool_run, job_id, completion_status, entry)
+
+        if settled:
+            await asyncio.to_thread(record)
+
+    async def fetch_terminal_jobs(self, watcher: JobSetWatcher) -> List[Dict]:
+        """
+        List the pending jobs of a watcher which reached a terminal state.
+
+        Args:
+            watcher (JobSetWatcher): The watcher holding the pending jobs.
+
+        Returns:
+            list: Job summaries ordered from the least to the most recently updated.
+        """
+        pending = watcher.get_pending()
+        jobs = []
+        offset = 0
+        while pending:
+            page = await self.client.get("jobs", params=watcher.build_params(offset))
+            if not watcher.collect_page(page, pending, jobs):
+                break
+            offset += watcher.page_size
+
+        return sorted(jobs, key=lambda job: job.get("update_time", ""))
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+from typing import (
+    Any,
+    Dict
+)
+
+
+class ChangeDetector:
+    def __init__(self, path: str):
+        """
+        Initialize the ChangeDetector class.
+
+        For every tool the state file keeps the version, a fingerprint of the option lists of its
+        data table backed params and of the sampling settings, and the hashes of the combinations
+        tested with them. A later sweep skips a tool whose version, options and sampling did not
+        change, and within a changed tool only runs the combinations which were not tested with the
+        same version before.
+
+        Args:
+            path (str): The JSON state file, created on the first save.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as file:
+                self.tools: Dict[str, Dict] = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.tools = {}
+        # Combination hashes as sets while the sweep runs, stored as sorted lists
+        for state in self.tools.values():
+            state["tested"] = set(state.get("tested", []))
+
+    def get_hash(self, value: Any) -> str:
+        """
+        Hash the canonical JSON form of a value.
+
+        Args:
+            value: The value to hash.
+
+        Returns:
+            str: The sha256 of the value.
+        """
+        canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get_fingerprint(self, options: Dict, sampling: Dict | None) -> str:
+        """
+        Hash the options of a tool together with the sampling settings of the sweep.
+
+        A sampled sweep only covers part of the combinations, so a later sweep with other settings
+        has to probe the tool again.
+
+        Args:
+            options (dict): The option values of every data table backed param.
+            sampling (dict | None): The sampling settings, as returned by CombinationSampler.get_settings().
+
+        Returns:
+            str: The fingerprint.
+        """
+        return self.get_hash({"options": options, "sampling": sampling})
+
+    def get_state(self, tool_id: str, version: str | None) -> Dict:
+        """
+        Return the state of a tool, starting over if the tool version changed.
+
+        Must be called with the lock held.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The current version of the tool.
+
+        Returns:
+            dict: The stored version, options fingerprint and tested combinations.
+        """
+        state = self.tools.get(tool_id)
+        if state is None or state.get("version") != version:
+            state = {"version": version, "fingerprint": None, "tested": set()}
+            self.tools[tool_id] = state
+        return state
+
+    def has_changed(self, tool_id: str, version: str | None, options: Dict, sampling: Dict | None = None) -> bool:
+        """
+        Check whether a tool needs to be probed in this sweep.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The current version of the tool.
+            options (dict): The option values of every data table backed param.
+            sampling (dict | None): The sampling settings of this sweep.
+
+        Returns:
+            bool: False if the last completed sweep of the tool had the same version, options and sampling.
+        Example:
+            >>> import tempfile
+            >>> detector = ChangeDetector(os.path.join(tempfile.mkdtemp(), "fingerprints.json"))
+            >>> detector.has_changed("humann", "3.8", {"db": ["a", "b"]})
+            True
+            >>> detector.mark_tested("humann", "3.8", {"db": "a"})
+            >>> detector.finish_tool("humann", "3.8", {"db": ["a", "b"]})
+            >>> detector.has_changed("humann", "3.8", {"db": ["a", "b"]})
+            False
+            >>> detector.has_changed("humann", "3.8", {"db": ["a", "b"]}, sampling={"strategy": "pairwise"})
+            True
+            >>> detector.has_changed("humann", "3.8", {"db": ["a", "b", "c"]}), detector.is_tested("humann", "3.8", {"db": "a"})
+            (True, True)
+            >>> detector.has_changed("humann", "3.9", {"db": ["a", "b"]}), detector.is_tested("humann", "3.9", {"db": "a"})
+            (True, False)
+        """
+        with self._lock:
+            return self.get_state(tool_id, version)["fingerprint"] != self.get_fingerprint(options, sampling)
+
+    def is_tested(self, tool_id: str, version: str | None, entry: Any) -> bool:
+        """
+        Check whether a combination was tested with the current tool version before.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The current version of the tool.
+            entry: The tool input of the combination.
+
+        Returns:
+            bool: True if the combination can be skipped.
+        """
+        with self._lock:
+            return self.get_hash(entry) in self.get_state(tool_id, version)["tested"]
+
+    def mark_tested(self, tool_id: str, version: str | None, entry: Any):
+        """
+        Record that a combination was tested, i.e. its job reached a final state.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The current version of the tool.
+            entry: The tool input of the combination.
+        """
+        with self._lock:
+            self.get_state(tool_id, version)["tested"].add(self.get_hash(entry))
+
+    def finish_tool(self, tool_id: str, version: str | None, options: Dict, sampling: Dict | None = None):
+        """
+        Record that every combination of a tool was probed with the given options and save the state.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+            options (dict): The option values of every data table backed param.
+            sampling (dict | None): The sampling settings of the sweep.
+        """
+        with self._lock:
+            self.get_state(tool_id, version)["fingerprint"] = self.get_fingerprint(options, sampling)
+        self.save()
+
+    def save(self):
+        """
+        Write the state file atomically.
+        """
+        with self._lock:
+            data = {
+                tool_id: state | {"tested": sorted(state["tested"])}
+                for tool_id, state in self.tools.items()
+            }
+            with open(f"{self.path}.tmp", 'w') as file:
+                json.dump(data, file)
+            os.replace(f"{self.path}.tmp", self.path)
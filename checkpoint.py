@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple
+)
+
+
+class CheckpointJournal:
+    def __init__(self, path: str, resume: bool = False):
+        """
+        Initialize the CheckpointJournal class.
+
+        The journal is a JSON lines file recording the datasets tracked by a run and, for every
+        tool and combination, the submitted job and its final state. Records are appended as they
+        happen, so an interrupted run can be picked up where it stopped.
+
+        Args:
+            path (str): The journal file.
+            resume (bool): Whether the records of the previous run are loaded, otherwise the journal starts empty.
+        """
+        self.path = path
+        self.datasets: Dict[str, List[str]] = {}
+        self.combinations: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+        if resume:
+            self.load()
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def load(self):
+        """
+        Replay the records of the journal, skipping a line left incomplete by the interrupted run.
+        """
+        try:
+            with open(self.path, 'r') as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.apply(record)
+        except FileNotFoundError:
+            return
+
+    def apply(self, record: Dict):
+        """
+        Update the in-memory state with one record.
+
+        Args:
+            record (dict): A 'datasets', 'submitted' or 'finished' record.
+        """
+        if record["type"] == "datasets":
+            self.datasets[record["history_id"]] = record["dataset_ids"]
+        elif record["type"] == "submitted":
+            self.combinations[(record["tool_id"], record["hash"])] = {
+                "job_id": record["job_id"],
+                "submitted_at": record["submitted_at"],
+                "state": None
+            }
+        elif record["type"] == "finished":
+            self.combinations.setdefault((record["tool_id"], record["hash"]), {"job_id": record["job_id"]})
+            self.combinations[(record["tool_id"], record["hash"])]["state"] = record["state"]
+
+    def append(self, record: Dict):
+        """
+        Apply a record and append it to the journal.
+
+        Args:
+            record (dict): The record to write.
+        """
+        with self._lock:
+            self.apply(record)
+            with open(self.path, 'a') as journal:
+                journal.write(json.dumps(record) + "\n")
+
+    def get_hash(self, entry: Any) -> str:
+        """
+        Hash the canonical JSON form of a combination.
+
+        Args:
+            entry: The tool input of the combination.
+
+        Returns:
+            str: The sha256 of the input.
+        """
+        canonical = json.dumps(entry, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def record_datasets(self, history_id: str, dataset_ids: List[str]):
+        """
+        Record the datasets whose tools are probed in a history.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+            dataset_ids (list): The IDs of the tracked datasets.
+        """
+        if self.datasets.get(history_id) != list(dataset_ids):
+            self.append({"type": "datasets", "history_id": history_id, "dataset_ids": list(dataset_ids)})
+
+    def get_datasets(self, history_id: str) -> List[str] | None:
+        """
+        Return the datasets tracked by the previous run in a history.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+
+        Returns:
+            list | None: The dataset IDs, None if the history was not tracked.
+        """
+        return self.datasets.get(history_id)
+
+    def record_submission(self, tool_id: str, entry: Any, job_id: str):
+        """
+        Record the job submitted for a combination.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            entry: The tool input of the combination.
+            job_id (str): The ID of the Galaxy job.
+        """
+        self.append({
+            "type": "submitted",
+            "tool_id": tool_id,
+            "hash": self.get_hash(entry),
+            "job_id": job_id,
+            "submitted_at": time.time()
+        })
+
+    def record_state(self, tool_id: str, entry: Any, job_id: str, state: str):
+        """
+        Record the final state of the job of a combination.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            entry: The tool input of the combination.
+            job_id (str): The ID of the Galaxy job.
+            state (str): The final state of the job.
+        """
+        self.append({"type": "finished", "tool_id": tool_id, "hash": self.get_hash(entry), "job_id": job_id, "state": state})
+
+    def get(self, tool_id: str, entry: Any) -> Dict | None:
+        """
+        Return the job and state recorded for a combination.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            entry: The tool input of the combination.
+
+        Returns:
+            dict | None: The job ID, submission time and final state, the state is None while the job runs.
+            None if the combination was never submitted.
+        Example:
+            >>> import tempfile
+            >>> path = os.path.join(tempfile.mkdtemp(), "checkpoint.jsonl")
+            >>> journal = CheckpointJournal(path)
+            >>> journal.record_submission("cutadapt", {"db": "a"}, "job1")
+            >>> journal.record_state("cutadapt", {"db": "a"}, "job1", "ok")
+            >>> journal.record_submission("cutadapt", {"db": "b"}, "job2")
+            >>> resumed = CheckpointJournal(path, resume=True)
+            >>> resumed.get("cutadapt", {"db": "a"})["state"], resumed.get("cutadapt", {"db": "b"})["state"]
+            ('ok', None)
+        """
+        with self._lock:
+            return self.combinations.get((tool_id, self.get_hash(entry)))
@@ -0,0 +1,159 @@
+import os
+import time
+from bioblend import ConnectionError
+from tusclient.exceptions import TusCommunicationError
+from tusclient.fingerprint.fingerprint import Fingerprint
+from tusclient.storage.filestorage import FileStorage
+from typing import (
+    Any,
+    Dict
+)
+
+
+class ChunkedUploader:
+    def __init__(
+        self,
+        gi,
+        chunk_size: int = 10 * 1024 * 1024,
+        threshold: int = 100 * 1024 * 1024,
+        storage_dir: str | None = None,
+        retries: int = 5,
+        retry_delay: float = 5.0
+    ):
+        """
+        Initialize the ChunkedUploader class.
+
+        Large files are sent to the tus endpoint of Galaxy one chunk at a time, so only one chunk is held
+        in memory and a failed chunk is sent again from the offset the server confirmed, instead of
+        starting the whole file over. Small files take the plain upload_file path.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            chunk_size (int): Number of bytes sent per request.
+            threshold (int): Size in bytes from which on files are uploaded in chunks.
+            storage_dir (str | None): Folder keeping the upload URL of every file, so an interrupted run
+                continues the upload of a file instead of starting it over. None to keep them for this run only.
+            retries (int): Number of failed chunks in a row after which the upload is given up.
+            retry_delay (float): Seconds to wait before a failed chunk is sent again.
+        """
+        self.gi = gi
+        self.chunk_size = chunk_size
+        self.threshold = threshold
+        self.storage_dir = storage_dir
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def upload(self, path: str, history_id: str, **kwargs: Any) -> Dict:
+        """
+        Upload a file to a history.
+
+        Args:
+            path (str): The local file.
+            history_id (str): The ID of the Galaxy history.
+            **kwargs: Options of the upload, e.g. file_name or file_type.
+
+        Returns:
+            dict: The upload job, as returned by upload_file.
+        """
+        if os.path.getsize(path) < self.threshold:
+            return self.gi.tools.upload_file(path=path, history_id=history_id, **kwargs)
+
+        uploader = self.create_uploader(path)
+        file_size = uploader.get_file_size()
+        if uploader.offset:
+            self.report_progress(path, uploader.offset, file_size, resumed=True)
+
+        failures = 0
+        while uploader.offset < file_size or not uploader.url:
+            try:
+                if failures and uploader.url:
+                    # Continue from what the server actually received
+                    uploader.offset = uploader.get_offset()
+                uploader.upload_chunk()
+            except (TusCommunicationError, ConnectionError) as e:
+                failures += 1
+                if failures > self.retries:
+                    raise
+                print(f"Upload of {path} failed at byte {uploader.offset}: {e}, retrying in {self.retry_delay} seconds")
+                time.sleep(self.retry_delay)
+                continue
+            failures = 0
+            self.report_progress(path, uploader.offset, file_size)
+
+        job = self.gi.tools.post_to_fetch(path, history_id, uploader.session_id, **kwargs)
+        # The finished upload is consumed by Galaxy, the next upload of the file starts over
+        self.forget_upload(path)
+        return job
+
+    def create_uploader(self, path: str):
+        """
+        Create the tus uploader of a file, continuing a stored upload if the server still knows it.
+
+        Args:
+            path (str): The local file.
+
+        Returns:
+            tusclient.uploader.Uploader: The uploader, its offset is the number of bytes already received.
+        """
+        storage = self.get_storage_path(path)
+        if storage is None:
+            return self.gi.get_tus_uploader(path, chunk_size=self.chunk_size)
+
+        os.makedirs(self.storage_dir, exist_ok=True)
+        try:
+            return self.gi.get_tus_uploader(path, storage=storage, chunk_size=self.chunk_size)
+        except ConnectionError as e:
+            # The stored upload expired on the server
+            print(f"Cannot continue the upload of {path}: {e}, starting over")
+            self.forget_upload(path)
+            return self.gi.get_tus_uploader(path, storage=storage, chunk_size=self.chunk_size)
+
+    def get_storage_path(self, path: str) -> str | None:
+        """
+        Return the file keeping the upload URL of a local file.
+
+        Every file has its own, so files uploaded at the same time do not write to the same storage.
+
+        Args:
+            path (str): The local file.
+
+        Returns:
+            str | None: The storage file, None if upload URLs are not kept.
+        """
+        if self.storage_dir is None:
+            return None
+        return os.path.join(self.storage_dir, f"{os.path.basename(path)}.json")
+
+    def forget_upload(self, path: str):
+        """
+        Remove the stored upload URL of a file.
+
+        Args:
+            path (str): The local file.
+        """
+        if self.storage_dir is None or not os.path.exists(self.get_storage_path(path)):
+            return
+        storage = FileStorage(self.get_storage_path(path))
+        try:
+            with open(path, 'rb') as file:
+                storage.remove_item(Fingerprint().get_fingerprint(file))
+        finally:
+            storage.close()
+
+    def report_progress(self, path: str, offset: int, file_size: int, resumed: bool = False):
+        """
+        Print how much of a file was uploaded.
+
+        Args:
+            path (str): The local file.
+            offset (int): Number of bytes the server received.
+            file_size (int): Size of the file in bytes.
+            resumed (bool): Whether the offset was reached by an earlier run.
+
+        Example:
+            >>> ChunkedUploader(gi=None).report_progress("T1A_forward", 5 * 1024 * 1024, 20 * 1024 * 1024)
+            Uploading T1A_forward: 25% (5.0 of 20.0 MB)
+        """
+        percent = 100 * offset // file_size if file_size else 100
+        prefix = "Resuming" if resumed else "Uploading"
+        print(f"{prefix} {path}: {percent}% ({offset / 1024 ** 2:.1f} of {file_size / 1024 ** 2:.1f} MB)")
@@ -0,0 +1,186 @@
+import math
+import random
+from itertools import combinations, product
+from typing import (
+    Dict,
+    Iterator,
+    List
+)
+
+
+class CombinationSampler:
+    STRATEGIES = ("exhaustive", "pairwise", "t-wise", "random")
+
+    def __init__(self, strategy: str = "exhaustive", strength: int = 2, sample_size: int | None = None, seed: int | None = None):
+        """
+        Initialize the CombinationSampler class.
+
+        Args:
+            strategy (str): 'exhaustive' for the full product, 'pairwise' or 't-wise' for a covering array
+                in which every combination of values of any 2 (or strength) params appears at least once,
+                'random' for a seeded random subset of the full product.
+            strength (int): The number of params whose value combinations are covered by 't-wise'.
+            sample_size (int | None): The number of combinations drawn by 'random'.
+            seed (int | None): The seed of the random number generator, for reproducible samples. Without a
+                seed 'random' draws one, so the settings name the sample that was actually taken.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy {strategy}, use one of {', '.join(self.STRATEGIES)}")
+        if strategy == "random" and not sample_size:
+            raise ValueError("The random sampling strategy needs a sample size")
+        if strength < 1:
+            raise ValueError(f"The strength must be at least 1 (got: {strength})")
+
+        self.strategy = strategy
+        self.strength = 2 if strategy == "pairwise" else strength
+        self.sample_size = sample_size
+        if strategy == "random" and seed is None:
+            # An unseeded sample differs from run to run, it must not look like the sample of an earlier sweep
+            seed = random.SystemRandom().randrange(2 ** 32)
+            print(f"Random sampling with seed {seed}, pass --seed {seed} to draw the same sample again")
+        self.seed = seed
+
+    def get_settings(self) -> Dict:
+        """
+        Return the settings which decide the selected combinations.
+
+        Returns:
+            dict: The strategy, strength, sample size and seed.
+        Example:
+            >>> CombinationSampler(strategy="random", sample_size=10, seed=1).get_settings()
+            {'strategy': 'random', 'strength': 2, 'sample_size': 10, 'seed': 1}
+            >>> CombinationSampler(strategy="random", sample_size=10).get_settings()["seed"] is None  # doctest: +ELLIPSIS
+            Random sampling with seed ..., pass --seed ... to draw the same sample again
+            False
+        """
+        return {"strategy": self.strategy, "strength": self.strength, "sample_size": self.sample_size, "seed": self.seed}
+
+    def count(self, dictionary: Dict, exclude_keys: List) -> int:
+        """
+        Count the combinations of the full product, without generating them.
+
+        Args:
+            dictionary (dict): The values of every key.
+            exclude_keys (list): The keys whose values are kept as a whole in every combination.
+
+        Returns:
+            int: The number of exhaustive combinations.
+        """
+        return math.prod(len(values) for key, values in dictionary.items() if key not in exclude_keys)
+
+    def sample(self, dictionary: Dict, exclude_keys: List) -> Iterator[Dict]:
+        """
+        Lazily generate the combinations selected by the strategy.
+
+        Args:
+            dictionary (dict): The values of every key.
+            exclude_keys (list): The keys whose values are kept as a whole in every combination.
+
+        Yields:
+            dict: One combination of key-value pairs, the excluded keys keep their full value list.
+        Example:
+            >>> values = {'a': [1, 2], 'b': [3, 4], 'c': [5, 6], 'd': [7]}
+            >>> len(list(CombinationSampler("exhaustive").sample(values, ['d'])))
+            8
+            >>> len(list(CombinationSampler("pairwise").sample(values, ['d'])))
+            4
+            >>> list(CombinationSampler("random", sample_size=2, seed=1).sample(values, ['d']))
+            [{'a': 1, 'b': 4, 'c': 5, 'd': [7]}, {'a': 2, 'b': 3, 'c': 5, 'd': [7]}]
+        """
+        excluded_dict = {key: dictionary[key] for key in exclude_keys}
+        keys = [key for key in dictionary if key not in exclude_keys]
+        values = [dictionary[key] for key in keys]
+
+        if self.strategy == "random":
+            rows = self.random_rows(values)
+        elif self.strategy in {"pairwise", "t-wise"} and len(values) > self.strength:
+            rows = self.covering_rows(values)
+        else:
+            # With no more params than the strength the covering array is the full product
+            rows = product(*values)
+
+        for row in rows:
+            yield dict(zip(keys, row)) | excluded_dict
+
+    def random_rows(self, values: List[List]) -> Iterator[tuple]:
+        """
+        Draw distinct rows of the full product uniformly at random.
+
+        Rows are drawn as indices into the product and decoded one by one, so the product is never built.
+
+        Args:
+            values (list): The values of every param.
+
+        Yields:
+            tuple: One value per param.
+        """
+        total = math.prod(len(param_values) for param_values in values)
+        rng = random.Random(self.seed)
+        for index in sorted(rng.sample(range(total), min(self.sample_size, total))):
+            row = []
+            for param_values in reversed(values):
+                index, position = divmod(index, len(param_values))
+                row.append(param_values[position])
+            yield tuple(reversed(row))
+
+    def covering_rows(self, values: List[List]) -> Iterator[tuple]:
+        """
+        Build a covering array of the configured strength with a greedy, deterministic construction.
+
+        Every row starts from a value combination that is not covered yet and fills the remaining params
+        with the value covering the most uncovered combinations, until every combination of values of any
+        'strength' params appears in at least one row.
+
+        Args:
+            values (list): The values of every param.
+
+        Yields:
+            tuple: One value per param.
+        """
+        if any(not param_values for param_values in values):
+            return
+
+        params = range(len(values))
+        # Uncovered value combinations, as param indices mapped to value indices, in a stable order
+        uncovered = {}
+        for param_set in combinations(params, self.strength):
+            for value_set in product(*(range(len(values[param])) for param in param_set)):
+                uncovered[(param_set, value_set)] = None
+
+        while uncovered:
+            param_set, value_set = next(iter(uncovered))
+            row = dict(zip(param_set, value_set))
+
+            for param in params:
+                if param in row:
+                    continue
+                row[param] = max(
+                    range(len(values[param])),
+                    key=lambda value: (self.count_covered(row, param, value, uncovered), -value)
+                )
+
+            for param_set in combinations(params, self.strength):
+                uncovered.pop((param_set, tuple(row[param] for param in param_set)), None)
+
+            yield tuple(values[param][row[param]] for param in params)
+
+    def count_covered(self, row: Dict[int, int], param: int, value: int, uncovered: Dict) -> int:
+        """
+        Count the uncovered combinations a value would cover together with the params already set in a row.
+
+        Args:
+            row (dict): The value index of every param set so far.
+            param (int): The param to set.
+            value (int): The candidate value index.
+            uncovered (dict): The uncovered value combinations.
+
+        Returns:
+            int: The number of newly covered combinations.
+        """
+        covered = 0
+        for others in combinations(sorted(row), self.strength - 1):
+            param_set = tuple(sorted(others + (param,)))
+            candidate = row | {param: value}
+            if (param_set, tuple(candidate[other] for other in param_set)) in uncovered:
+                covered += 1
+        return covered
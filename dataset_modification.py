@@ -32,29 +32,41 @@ class DatasetModification:
         if item_type == "file":
             item_id = item['id']
             dataset_details = self.gi.histories.show_dataset_provenance(history_id=self.history_id, dataset_id=item_id)
+            tool_id, parameters = self.read_provenance(dataset_details)
+        return tool_id, parameters
+
+    def read_provenance(self, dataset_details):
+        """
+        Extract the tool ID and the parameters of the job which created a dataset.
+
+        Args:
+            dataset_details (dict): The provenance of the dataset.
+
+        Returns:
+            tuple: A tuple containing the tool ID and parameters.
+        """
+        tool_id = dataset_details["tool_id"]
+        if tool_id != '__DATA_FETCH__':
+            parameters = dataset_details.get('parameters', {})
+            keys_to_remove = []
+
+            for key, value in parameters.items():
+                if "|" in key:
+                    keys_to_remove.append(key)
+                if value is not None:
+                    try:
+                        if isinstance(value, dict) or isinstance(value, list):
+                            parsed_dict = value
+                        else:
+                            parsed_dict = json.loads(value)
+                            parameters[key] = parsed_dict
+                    except json.JSONDecodeError:
+                        print("The original string is not a valid JSON format. Perform alternative actions here.")
 
-            tool_id = dataset_details["tool_id"]
-            if tool_id != '__DATA_FETCH__':
-                parameters = dataset_details.get('parameters', {})
-                keys_to_remove = []
-
-                for key, value in parameters.items():
-                    if "|" in key:
-                        keys_to_remove.append(key)
-                    if value is not None:
-                        try:
-                            if isinstance(value, dict) or isinstance(value, list):
-                                parsed_dict = value
-                            else:
-                                parsed_dict = json.loads(value)
-                                parameters[key] = parsed_dict
-                        except json.JSONDecodeError:
-                            print("The original string is not a valid JSON format. Perform alternative actions here.")
-
-                for key_to_remove in keys_to_remove:
-                    parameters.pop(key_to_remove, None)
-                self.replace_uuid_with_src(parameters)
-                self.dictionary[tool_id] = parameters
+            for key_to_remove in keys_to_remove:
+                parameters.pop(key_to_remove, None)
+            self.replace_uuid_with_src(parameters)
+            self.dictionary[tool_id] = parameters
         return tool_id, parameters
 
     def replace_uuid_with_src(self, input_dict):
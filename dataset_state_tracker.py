@@ -0,0 +1,137 @@
+from bioblend import ConnectionError
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Tuple
+)
+
+
+class DatasetStateTracker:
+    # States after which a dataset will not change anymore without user interaction
+    FINISHED_STATES = {"ok", "error", "paused", "deleted"}
+
+    # Only request the fields needed to follow the state and to fetch the provenance afterwards
+    CONTENT_KEYS = ["id", "hid", "name", "type", "history_content_type", "state"]
+
+    # Number of dataset IDs filtered for in one request, keeps the URL short
+    IDS_PER_REQUEST = 100
+
+    def __init__(self, gi, history_id: str, dataset_ids: Iterable[str]):
+        """
+        Initialize the DatasetStateTracker class.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            history_id (str): The ID of the Galaxy history containing the datasets.
+            dataset_ids (Iterable[str]): The IDs of the datasets to track.
+        """
+        self.gi = gi
+        self.history_id = history_id
+        # Last known state of every tracked dataset, None until the first poll
+        self.states: Dict[str, str | None] = {dataset_id: None for dataset_id in dataset_ids}
+
+    @property
+    def pending(self) -> List[str]:
+        """
+        IDs of the tracked datasets that did not reach a finished state yet.
+        """
+        return [dataset_id for dataset_id, state in self.states.items() if state not in self.FINISHED_STATES]
+
+    def fetch_contents(self) -> Dict[str, Dict]:
+        """
+        Fetch the state of the pending datasets with a history contents request filtered by their IDs.
+
+        Only the pending datasets are listed by the server, so the earlier contents of the history,
+        e.g. the outputs of earlier sweeps, are not downloaded on every poll.
+
+        Returns:
+            dict: The history items of the pending datasets, keyed by dataset ID.
+
+        Raises:
+            ConnectionError: If the server does not answer with status 200.
+        """
+        items = []
+        for params in self.build_params():
+            response = self.gi.make_get_request(f"{self.gi.url}/histories/{self.history_id}/contents", params=params)
+            if response.status_code != 200:
+                raise ConnectionError(
+                    f"Unexpected HTTP status code: {response.status_code}",
+                    body=response.text,
+                    status_code=response.status_code
+                )
+            items.extend(response.json())
+        return self.index_items(items)
+
+    def build_params(self) -> List[Dict[str, str]]:
+        """
+        Return the query parameters of the history contents requests listing the pending datasets.
+
+        Returns:
+            list: The parameters of every request, at most IDS_PER_REQUEST datasets each.
+        Example:
+            >>> tracker = DatasetStateTracker(gi=None, history_id="h", dataset_ids=["a", "b", "c"])
+            >>> tracker.states["b"] = "ok"
+            >>> tracker.build_params()[0]["ids"]
+            'a,c'
+        """
+        pending = self.pending
+        return [
+            {
+                "ids": ",".join(pending[start:start + self.IDS_PER_REQUEST]),
+                "deleted": "false",
+                "types": "dataset",
+                "keys": ",".join(self.CONTENT_KEYS)
+            }
+            for start in range(0, len(pending), self.IDS_PER_REQUEST)
+        ]
+
+    def index_items(self, items: List[Dict]) -> Dict[str, Dict]:
+        """
+        Key the tracked datasets of a history contents listing by their ID.
+
+        Args:
+            items (list): The history items.
+
+        Returns:
+            dict: The history items of the tracked datasets, keyed by dataset ID.
+        """
+        return {item["id"]: item for item in items if item["id"] in self.states}
+
+    def poll(self) -> List[Tuple[Dict, str | None]]:
+        """
+        Refresh the state of all pending datasets and report the ones that just finished.
+
+        A dataset is reported only once, on the poll in which it moves into one of the
+        finished states ('ok', 'error', 'paused'). Datasets that disappeared from the history
+        are reported as 'deleted' so they do not stay pending forever.
+
+        Returns:
+            list: Tuples of (history item, previous state) for every dataset that finished since the last poll.
+        """
+        if not self.pending:
+            return []
+        return self.update(self.fetch_contents())
+
+    def update(self, items: Dict[str, Dict]) -> List[Tuple[Dict, str | None]]:
+        """
+        Apply fetched history items to the pending datasets and report the ones that just finished.
+
+        Args:
+            items (dict): The history items of the tracked datasets, keyed by dataset ID.
+
+        Returns:
+            list: Tuples of (history item, previous state) for every dataset that finished.
+        """
+        pending = self.pending
+        transitions = []
+
+        for dataset_id in pending:
+            previous_state = self.states[dataset_id]
+            item = items.get(dataset_id, {"id": dataset_id, "type": "file", "state": "deleted"})
+            self.states[dataset_id] = item["state"]
+
+            if item["state"] in self.FINISHED_STATES:
+                transitions.append((item, previous_state))
+
+        return transitions
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import (
+    Any,
+    Dict,
+    Iterator
+)
+
+
+class ErrorStore:
+    def __init__(self, tool_name: str, directory: str = "."):
+        """
+        Initialize the ErrorStore class.
+
+        Failing combinations of a tool are appended to a JSON lines log, one record per line, and an
+        in-memory set of input hashes keeps every combination only once. A JSON array written by
+        earlier versions is taken over into the log the first time the store is opened.
+
+        Args:
+            tool_name (str): The name of the tool.
+            directory (str): Folder holding the files of the tool.
+        """
+        self.tool_name = tool_name
+        self.log_path = os.path.join(directory, f"{tool_name}_incorrect_combination.jsonl")
+        self.json_path = os.path.join(directory, f"{tool_name}_incorrect_combination.json")
+        self.hashes = set()
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.log_path):
+            self.migrate_json()
+        for record in self.read_records():
+            self.hashes.add(self.get_hash(record.get("input")))
+
+    def get_hash(self, entry: Any) -> str:
+        """
+        Hash the canonical JSON form of a combination, so equal inputs hash equally regardless of key order.
+
+        Args:
+            entry: The tool input of the combination.
+
+        Returns:
+            str: The sha256 of the input.
+        Example:
+            >>> store = ErrorStore.__new__(ErrorStore)
+            >>> store.get_hash({'a': 1, 'b': [2]}) == store.get_hash({'b': [2], 'a': 1})
+            True
+        """
+        canonical = json.dumps(entry, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def migrate_json(self):
+        """
+        Copy the records of an existing JSON array file into the log.
+        """
+        try:
+            with open(self.json_path, 'r') as json_file:
+                data = json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if not isinstance(data, list):
+            data = [data]
+        with open(self.log_path, 'w') as log_file:
+            for record in data:
+                log_file.write(json.dumps(record) + "\n")
+
+    def read_records(self) -> Iterator[Dict]:
+        """
+        Read the records of the log, skipping a line left incomplete by an interrupted run.
+
+        Yields:
+            dict: One record with timestamp, error message and input.
+        """
+        try:
+            with open(self.log_path, 'r') as log_file:
+                for line in log_file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            return
+
+    def add(self, entry: Any, error_message: str) -> bool:
+        """
+        Append a failing combination to the log, unless the same input was stored before.
+
+        Args:
+            entry: The tool input of the combination.
+            error_message (str): The error message associated with the entry.
+
+        Returns:
+            bool: True if the entry was new and written.
+        """
+        entry_hash = self.get_hash(entry)
+        with self._lock:
+            if entry_hash in self.hashes:
+                return False
+            record = {
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "error_message": error_message,
+                "input": entry
+            }
+            with open(self.log_path, 'a') as log_file:
+                log_file.write(json.dumps(record) + "\n")
+            self.hashes.add(entry_hash)
+            return True
+
+    def export_json(self, file_path: str | None = None) -> str:
+        """
+        Write all records as an indented JSON array, the format read by earlier versions.
+
+        Args:
+            file_path (str | None): The target file, None for the JSON file of the tool.
+
+        Returns:
+            str: The path of the written file.
+        """
+        file_path = file_path or self.json_path
+        with self._lock:
+            data = list(self.read_records())
+        with open(f"{file_path}.tmp", 'w') as json_file:
+            json.dump(data, json_file, indent=2)
+        os.replace(f"{file_path}.tmp", file_path)
+        return file_path
@@ -0,0 +1,187 @@
+import gzip
+import os
+import random
+from itertools import islice
+from typing import (
+    IO,
+    Iterator,
+    List,
+    Tuple
+)
+
+
+class FastqSubsampler:
+    METHODS = ("first", "reservoir")
+
+    def __init__(self, read_count: int, method: str = "first", seed: int = 0):
+        """
+        Initialize the FastqSubsampler class.
+
+        Paired-end FASTQ files are read record by record in lockstep, so mates stay together and
+        memory is bounded by the number of kept reads, not by the size of the input.
+
+        Args:
+            read_count (int): Number of read pairs kept.
+            method (str): 'first' to keep the first reads, 'reservoir' for a uniform random sample of all reads.
+            seed (int): The seed of the reservoir sampling, the same seed gives the same sample, so an
+                unchanged input is not uploaded again.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown subsampling method {method}, use one of {', '.join(self.METHODS)}")
+        if read_count < 1:
+            raise ValueError(f"The read count must be at least 1 (got: {read_count})")
+        self.read_count = read_count
+        self.method = method
+        self.seed = seed
+
+    def open_fastq(self, path: str, mode: str = 'rt') -> IO:
+        """
+        Open a plain or gzip compressed FASTQ file.
+
+        Args:
+            path (str): The file.
+            mode (str): The mode of open().
+
+        Returns:
+            IO: The text stream.
+        """
+        if path.endswith(".gz"):
+            return gzip.open(path, mode)
+        return open(path, mode)
+
+    def read_records(self, stream: IO) -> Iterator[Tuple[str, ...]]:
+        """
+        Read the four line records of a FASTQ file.
+
+        Args:
+            stream (IO): The text stream.
+
+        Yields:
+            tuple: The header, sequence, separator and quality line of one read.
+
+        Raises:
+            ValueError: If a record is truncated or does not start with '@'.
+        """
+        while True:
+            record = tuple(islice(stream, 4))
+            if not record:
+                return
+            if len(record) < 4 or not record[0].startswith("@"):
+                raise ValueError(f"Malformed FASTQ record: {record[0].strip() if record else ''}")
+            yield record
+
+    def get_read_name(self, header: str) -> str:
+        """
+        Return the name of a read without the mate suffix.
+
+        Args:
+            header (str): The header line.
+
+        Returns:
+            str: The read name.
+        Example:
+            >>> sampler = FastqSubsampler(read_count=1)
+            >>> sampler.get_read_name("@SRR1.7/1"), sampler.get_read_name("@SRR1.7 2:N:0:1")
+            ('SRR1.7', 'SRR1.7')
+        """
+        name = header[1:].split()[0] if header[1:].strip() else ""
+        if name.endswith(("/1", "/2")):
+            name = name[:-2]
+        return name
+
+    def read_pairs(self, forward: IO, reverse: IO) -> Iterator[Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+        """
+        Read the records of both mates together.
+
+        Args:
+            forward (IO): The forward reads.
+            reverse (IO): The reverse reads.
+
+        Yields:
+            tuple: The forward and the reverse record of one pair.
+
+        Raises:
+            ValueError: If the files have a different number of reads or the mates do not match.
+        """
+        reverse_records = self.read_records(reverse)
+        for forward_record in self.read_records(forward):
+            reverse_record = next(reverse_records, None)
+            if reverse_record is None:
+                raise ValueError("The reverse file has fewer reads than the forward file")
+            if self.get_read_name(forward_record[0]) != self.get_read_name(reverse_record[0]):
+                raise ValueError(f"Mates out of sync: {forward_record[0].strip()} and {reverse_record[0].strip()}")
+            yield forward_record, reverse_record
+        if next(reverse_records, None) is not None:
+            raise ValueError("The reverse file has more reads than the forward file")
+
+    def sample(self, pairs: Iterator) -> List:
+        """
+        Select the read pairs to keep.
+
+        Args:
+            pairs (Iterator): The read pairs.
+
+        Returns:
+            list: The kept pairs, in the order of the input.
+        Example:
+            >>> FastqSubsampler(read_count=3).sample(iter(range(10)))
+            [0, 1, 2]
+            >>> FastqSubsampler(read_count=3, method="reservoir", seed=1).sample(iter(range(10)))
+            [5, 6, 7]
+        """
+        if self.method == "first":
+            return list(islice(pairs, self.read_count))
+
+        # Algorithm R, every pair ends up in the reservoir with the same probability
+        rng = random.Random(self.seed)
+        reservoir = []
+        for index, pair in enumerate(pairs):
+            if index < self.read_count:
+                reservoir.append((index, pair))
+            else:
+                position = rng.randint(0, index)
+                if position < self.read_count:
+                    reservoir[position] = (index, pair)
+        return [pair for _, pair in sorted(reservoir, key=lambda item: item[0])]
+
+    def get_output_path(self, path: str, output_dir: str) -> str:
+        """
+        Return the path of the subsampled copy of a file.
+
+        Args:
+            path (str): The input file.
+            output_dir (str): The folder of the subsampled files.
+
+        Returns:
+            str: The output file, named after the input, the method and the read count.
+        """
+        name = os.path.basename(path)
+        if name.endswith(".gz"):
+            name = name[:-3]
+        return os.path.join(output_dir, f"{name}.{self.method}{self.read_count}")
+
+    def subsample_pair(self, forward_path: str, reverse_path: str, output_dir: str) -> Tuple[str, str]:
+        """
+        Write subsampled copies of a pair of FASTQ files.
+
+        Args:
+            forward_path (str): The forward reads.
+            reverse_path (str): The reverse reads.
+            output_dir (str): The folder of the subsampled files.
+
+        Returns:
+            tuple: The paths of the subsampled forward and reverse files.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        with self.open_fastq(forward_path) as forward, self.open_fastq(reverse_path) as reverse:
+            pairs = self.sample(self.read_pairs(forward, reverse))
+
+        output_paths = (self.get_output_path(forward_path, output_dir), self.get_output_path(reverse_path, output_dir))
+        for mate, output_path in enumerate(output_paths):
+            with open(f"{output_path}.tmp", 'w') as output:
+                for pair in pairs:
+                    output.writelines(pair[mate])
+            os.replace(f"{output_path}.tmp", output_path)
+
+        print(f"Subsampled {len(pairs)} read pairs to {output_paths[0]} and {output_paths[1]}")
+        return output_paths
@@ -1,41 +1,225 @@
+import hashlib
 import os
-import urllib.request
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Dict,
+    List
+)
 
 
 class FileDownloader:
-    def __init__(self):
+    # Checksum keys accepted in a file entry of the config, strongest first
+    CHECKSUM_ALGORITHMS = ("sha256", "md5")
+
+    def __init__(self, max_workers: int = 4, chunk_size: int = 1024 * 1024, session: requests.Session | None = None):
         """
         Initialize the FileDownloader class.
+
+        Args:
+            max_workers (int): Maximum number of files downloaded at the same time.
+            chunk_size (int): Number of bytes written per chunk of a download.
+            session (requests.Session | None): Session used for the downloads, None for plain requests.
+        """
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.session = session or requests
+
+    def download_files(self, entries: List[Dict]) -> List[str]:
+        """
+        Download several files concurrently.
+
+        Args:
+            entries (list): One dictionary per file with 'url' and 'destination_folder', optionally
+                'rename_to' and a 'sha256' or 'md5' checksum.
+
+        Returns:
+            list: The paths of the files, in the order of the entries.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self.download_file,
+                    url=entry["url"],
+                    destination_folder=entry["destination_folder"],
+                    rename_to=entry.get("rename_to"),
+                    checksum=self.get_checksum(entry)
+                )
+                for entry in entries
+            ]
+            return [future.result() for future in futures]
+
+    def get_checksum(self, entry: Dict) -> tuple | None:
+        """
+        Return the checksum given for a file entry.
+
+        Args:
+            entry (dict): The file entry of the config.
+
+        Returns:
+            tuple | None: The algorithm and the expected hex digest, None if no checksum is given.
+        Example:
+            >>> FileDownloader().get_checksum({'url': 'https://zenodo.org/file', 'md5': 'ABC'})
+            ('md5', 'abc')
         """
-        # The FileDownloader class doesn't need initial parameters in this case
-        pass
+        for algorithm in self.CHECKSUM_ALGORITHMS:
+            if entry.get(algorithm):
+                return algorithm, entry[algorithm].lower()
+        return None
 
-    def download_file(self, url, destination_folder):
+    def download_file(self, url, destination_folder, rename_to: str | None = None, checksum: tuple | None = None):
         """
         Download a file from the given URL and save it to the specified destination folder.
 
+        A file which is already present and matches its checksum, or the size announced by the server
+        if there is no checksum, is not downloaded again. An interrupted download is kept as a '.part'
+        file and continued with a range request.
+
         Args:
             url (str): The URL of the file to be downloaded.
             destination_folder (str): The folder where the downloaded file will be saved.
+            rename_to (str | None): The name of the saved file, None for the name in the URL.
+            checksum (tuple | None): The algorithm and the expected hex digest of the file.
 
         Returns:
             str: The full path to the downloaded file.
+
+        Raises:
+            ValueError: If the downloaded file does not match the checksum.
+        Example:
+            >>> import http.server, tempfile, threading
+            >>> content, ranges = b"ACGTTGCAACGTTGCA", []
+            >>> class RangeHandler(http.server.BaseHTTPRequestHandler):
+            ...     def do_GET(self):
+            ...         ranges.append(self.headers.get("Range"))
+            ...         start = int(self.headers.get("Range", "bytes=0-")[6:-1])
+            ...         self.send_response(206 if start else 200)
+            ...         self.send_header("Content-Length", str(len(content) - start))
+            ...         self.end_headers()
+            ...         self.wfile.write(content[start:])
+            ...     def log_message(self, *args):
+            ...         pass
+            >>> server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+            >>> threading.Thread(target=server.serve_forever, daemon=True).start()
+            >>> url = f"http://127.0.0.1:{server.server_port}/reads.fastq"
+            >>> folder = tempfile.mkdtemp()
+            >>> checksum = ("sha256", hashlib.sha256(content).hexdigest())
+            >>> downloader = FileDownloader()
+
+            An interrupted download continues after the bytes of the '.part' file:
+
+            >>> with open(os.path.join(folder, "reads.fastq.part"), "wb") as file:
+            ...     _ = file.write(content[:7])
+            >>> path = downloader.download_file(url, folder, checksum=checksum)  # doctest: +ELLIPSIS
+            File downloaded to: .../reads.fastq
+            >>> ranges, open(path, "rb").read() == content
+            (['bytes=7-'], True)
+
+            A present file matching its checksum is not downloaded again:
+
+            >>> path = downloader.download_file(url, folder, checksum=checksum)  # doctest: +ELLIPSIS
+            File already downloaded: .../reads.fastq
+            >>> len(ranges)
+            1
+
+            A download not matching its checksum is rejected and its partial file removed:
+
+            >>> downloader.download_file(url, folder, rename_to="other.fastq", checksum=("md5", "0" * 32))  # doctest: +ELLIPSIS
+            Traceback (most recent call last):
+            ...
+            ValueError: Checksum mismatch for http://127.0.0.1:.../reads.fastq, expected md5 000...
+            >>> sorted(os.listdir(folder))
+            ['reads.fastq']
+            >>> server.shutdown()
         """
         # Create the destination folder if it doesn't exist
         os.makedirs(destination_folder, exist_ok=True)
 
-        # Extract the file name from the URL
-        file_name = self.extract_file_name(url)
-
         # Construct the full path to the destination file
-        destination_path = os.path.join(destination_folder, file_name)
+        destination_path = os.path.join(destination_folder, rename_to or self.extract_file_name(url))
 
-        # Download the file
-        urllib.request.urlretrieve(url, destination_path)
+        if os.path.exists(destination_path) and self.is_cached(url, destination_path, checksum):
+            print(f"File already downloaded: {destination_path}")
+            return destination_path
+
+        partial_path = f"{destination_path}.part"
+        self.fetch(url, partial_path)
+
+        if checksum is not None and not self.verify(partial_path, checksum):
+            os.remove(partial_path)
+            raise ValueError(f"Checksum mismatch for {url}, expected {checksum[0]} {checksum[1]}")
+        os.replace(partial_path, destination_path)
 
         print(f"File downloaded to: {destination_path}")
         return destination_path
 
+    def fetch(self, url: str, partial_path: str):
+        """
+        Download a URL into a partial file, continuing after the bytes already present.
+
+        Args:
+            url (str): The URL of the file.
+            partial_path (str): The partial file.
+
+        Raises:
+            requests.exceptions.HTTPError: If the server answers with an error.
+        """
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 416:
+                # The partial file already holds the whole content
+                return
+            response.raise_for_status()
+            # A server ignoring the range request sends the whole file again
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(partial_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    file.write(chunk)
+
+    def is_cached(self, url: str, path: str, checksum: tuple | None) -> bool:
+        """
+        Check whether a present file is complete.
+
+        Args:
+            url (str): The URL of the file.
+            path (str): The present file.
+            checksum (tuple | None): The algorithm and the expected hex digest of the file.
+
+        Returns:
+            bool: True if the file matches its checksum, or without checksum the size the server announces.
+        """
+        if checksum is not None:
+            return self.verify(path, checksum)
+        try:
+            response = self.session.head(url, allow_redirects=True)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            # Without a connection the present file is the best there is
+            print(f"Failed to check {url}: {e}")
+            return True
+        size = response.headers.get("Content-Length")
+        return size is None or int(size) == os.path.getsize(path)
+
+    def verify(self, path: str, checksum: tuple) -> bool:
+        """
+        Compare the digest of a file with the expected one.
+
+        Args:
+            path (str): The file.
+            checksum (tuple): The algorithm and the expected hex digest.
+
+        Returns:
+            bool: True if the digests match.
+        """
+        algorithm, expected = checksum
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(self.chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest() == expected
+
     def extract_file_name(self, url):
         """
         Extract the file name from a given URL.
@@ -55,22 +239,3 @@ class FileDownloader:
         except IndexError:
             # Handle the case where the URL format is unexpected
             raise ValueError("Unable to extract file name from the URL")
-
-    def rename_file(self, old_path, new_name):
-        """
-        Rename a file located at the old path to the new name.
-
-        Args:
-            old_path (str): The current path of the file.
-            new_name (str): The new name for the file.
-
-        Returns:
-            str: The full path to the renamed file.
-        """
-        # Rename the downloaded file
-        new_path = os.path.join(os.path.dirname(old_path), new_name)
-
-        os.rename(old_path, new_path)
-
-        print(f"File renamed to: {new_path}")
-        return new_path
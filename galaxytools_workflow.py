@@ -1,25 +1,68 @@
-from bioblend import galaxy
 from bioblend import ConnectionError
 from pprint import pprint
 import threading
 import time
 import json
-import copy
-from itertools import product
+import hashlib
+import os
+from itertools import islice
 from xml_parser import XMLParser
 from html_content_extractor import HTMLContentExtractor
 from dataset_modification import DatasetModification
-from datetime import datetime
+from dataset_state_tracker import DatasetStateTracker
+from poll_scheduler import PollScheduler
+from job_watcher import JobSetWatcher
+from submission_pool import SubmissionPool
+from tool_metadata_cache import ToolMetadataCache
+from tool_source_cache import ToolSourceCache
+from combination_sampler import CombinationSampler
+from input_patcher import InputPatcher
+from select_parameter_index import SelectParameterIndex
+from error_store import ErrorStore
+from results_db import ResultsDatabase
+from checkpoint import CheckpointJournal
+from change_detector import ChangeDetector
+from upload_manager import UploadManager
+from chunked_uploader import ChunkedUploader
+from history_cleaner import HistoryCleaner
+from history_shards import HistoryShards
+from http_transport import HttpTransport, PooledGalaxyInstance
+from health_monitor import HealthMonitor
 from typing import (
     List,
     Dict,
-    Any
+    Any,
+    Iterator
 )
 
 
 class GalaxyWorkflow:
-    def __init__(self, server: str, api_key: str) -> None:
-        self.gi = galaxy.GalaxyInstance(url=server, key=api_key)
+    def __init__(
+        self,
+        server: str,
+        api_key: str,
+        tool_cache_dir: str | None = None,
+        max_combinations: int | None = None,
+        dry_run: bool = False,
+        sampler: CombinationSampler | None = None,
+        results_db: str | None = None,
+        checkpoint_file: str | None = None,
+        resume: bool = False,
+        change_state_file: str | None = None,
+        upload_chunk_size: int = 10 * 1024 * 1024,
+        chunked_upload_threshold: int = 100 * 1024 * 1024,
+        upload_state_dir: str | None = None,
+        shard_histories: bool = False,
+        transport: HttpTransport | None = None,
+        health_interval: float = 60.0,
+        health_latency_threshold: float = 20.0
+    ) -> None:
+        # Galaxy API, tool sources and health checks share one pool of keep-alive connections
+        self.transport = transport or HttpTransport()
+        self.gi = PooledGalaxyInstance(url=server, key=api_key, transport=self.transport)
+        # Circuit breaker fed by every request of the transport, pauses submissions and polling during outages
+        self.health = HealthMonitor(gi=self.gi, interval=health_interval, latency_threshold=health_latency_threshold)
+        self.transport.observers.append(self.health.record_request)
         self.api_key = api_key
         self.server = server
         self.history_id = ""
@@ -27,6 +70,42 @@ class GalaxyWorkflow:
         self.file_path = "tool_data.json"
         self.datatables_name = []
         self.problematic_file_ids = []  # Initialize an empty list to store file IDs
+        self.max_combinations = max_combinations  # Upper bound of combinations submitted per tool
+        self.dry_run = dry_run  # Only count the combinations, do not submit them
+        self.sampler = sampler or CombinationSampler()  # Selects which combinations of a tool are run
+        self.sampling_summary = {}  # Number of exhaustive and selected combinations per tool
+        # Shared poller for jobs and invocations, gives up on anything still running after a day
+        self.scheduler = PollScheduler(gi=self.gi, deadline=24 * 60 * 60, health=self.health)
+        # Bounded pools for the combination submissions and for probing several tools at once,
+        # combinations are generated lazily and wait for a free slot before they are queued
+        self.submission_pool = SubmissionPool(
+            max_workers=8, server=server, max_per_server=4, max_queued=32, health=self.health
+        )
+        self.tool_pool = SubmissionPool(max_workers=4)
+        # Append-only error logs, one per tool, created on the first failing combination
+        self.error_stores: Dict[str, ErrorStore] = {}
+        self.error_lock = threading.Lock()
+        # Optional SQLite record of every run, combination and job
+        self.results = ResultsDatabase(path=results_db) if results_db else None
+        # Journal of the submitted combinations, a resumed run skips the finished ones
+        self.resume = resume
+        self.checkpoint = CheckpointJournal(path=checkpoint_file, resume=resume) if checkpoint_file else None
+        # Versions and data table options of the tools tested before, None to test every tool in full
+        self.change_detector = ChangeDetector(path=change_state_file) if change_state_file else None
+        # Large inputs are uploaded in resumable chunks, small ones in one request
+        self.history_cleaner = HistoryCleaner(gi=self.gi)
+        # Every probed tool runs in a scratch history of its own, created once the history name is known
+        self.shard_histories = shard_histories
+        self.history_shards = None
+        self.chunked_uploader = ChunkedUploader(
+            gi=self.gi, chunk_size=upload_chunk_size, threshold=chunked_upload_threshold, storage_dir=upload_state_dir
+        )
+        # One show_tool request per tool, optionally kept on disk between runs
+        self.tool_metadata = ToolMetadataCache(gi=self.gi, server=server, cache_dir=tool_cache_dir)
+        # Raw tool sources are kept next to the metadata and only downloaded for unknown tool versions
+        self.tool_source_cache = None
+        if tool_cache_dir is not None:
+            self.tool_source_cache = ToolSourceCache(cache_dir=os.path.join(tool_cache_dir, "sources"), session=self.transport)
 
     def connect_to_galaxy_with_retry(self):
         while True:
@@ -39,12 +118,26 @@ class GalaxyWorkflow:
                 print("Retrying in 2 seconds...")
                 time.sleep(2)  # Wait for 2 seconds before retrying
 
+    def get_galaxy_version(self) -> str | None:
+        """
+        Return the version of the Galaxy server.
+
+        Returns:
+            str | None: The major version, None if the server could not be reached.
+        """
+        try:
+            return self.gi.config.get_version().get("version_major")
+        except ConnectionError as e:
+            print(f"Failed to get the Galaxy version: {e}")
+            return None
+
     def upload_file(self, file_name: str, new_name: str | None = None):
         """
         Upload a file to Galaxy and wait for the completion of the upload job.
 
         This function uploads a file to a Galaxy history, monitors the upload job's completion,
-        and returns the ID of the uploaded dataset.
+        and returns the ID of the uploaded dataset. Files above the chunked upload threshold are
+        sent in chunks to the tus endpoint and continue after network errors.
 
         Parameters:
         - file_name (str): The name of the file to upload.
@@ -54,16 +147,29 @@ class GalaxyWorkflow:
         - str: The ID of the uploaded dataset.
         """
         # Upload the file to Galaxy
-        job = self.gi.tools.upload_file(path=file_name, history_id=self.history_id, file_name=new_name)
+        job = self.chunked_uploader.upload(path=file_name, history_id=self.history_id, file_name=new_name)
         job_id = job["jobs"][0]["id"]
 
         # Wait for the completion of the upload job
         self.wait_for_job_completion(job_id=job_id)
-        self.gi.jobs.wait_for_job(job_id=job_id)
-        self.wait_for_job_completion(job_id=job_id)
 
         return job["outputs"][0]["id"]
 
+    def upload_files(self, files: List[tuple]) -> List[str]:
+        """
+        Upload several files to Galaxy, reusing datasets of the history with the same content.
+
+        Parameters:
+        - files (list): Tuples of the local path and the desired name of every file.
+
+        Returns:
+        - list: The IDs of the datasets, in the order of the files.
+        """
+        upload_manager = UploadManager(
+            gi=self.gi, history_id=self.history_id, scheduler=self.scheduler, uploader=self.chunked_uploader
+        )
+        return upload_manager.upload_files(files)
+
     def workflow_input(self, forward_id: str, reverse_id: str):
         """
         Create input specifications for a Galaxy workflow using forward and reverse dataset IDs.
@@ -135,8 +241,8 @@ class GalaxyWorkflow:
         """
         Wait for the completion of a specific workflow invocation.
 
-        This method continuously checks the state of the workflow invocation until it is no longer in the 'new' state.
-        It sleeps for 5 seconds between each check.
+        The invocation is registered with the shared poll scheduler, which checks its state with
+        an increasing interval until it is no longer in the 'new' state.
 
         Args:
             workflow_id (str): The ID of the workflow.
@@ -145,46 +251,47 @@ class GalaxyWorkflow:
         Returns:
             dict: Information about the workflow invocation once it's no longer in the 'new' state.
         """
-        while True:
-            workflow_invocation_info = self.gi.workflows.show_invocation(workflow_id=workflow_id, invocation_id=invocation_id)
-            if workflow_invocation_info['state'] not in {'new'}:
-                return workflow_invocation_info
-            time.sleep(5)
-
-    def delete_dataset_and_datacollection(self):
+        self.scheduler.register(
+            key=invocation_id,
+            probe=lambda: self.gi.workflows.show_invocation(workflow_id=workflow_id, invocation_id=invocation_id)['state'],
+            pending_states={'new'}
+        ).result()
+        return self.gi.workflows.show_invocation(workflow_id=workflow_id, invocation_id=invocation_id)
+
+    def delete_dataset_and_datacollection(self, keep_ids: List[str]):
         """
-        Delete datasets and dataset collections from a Galaxy history, excluding certain predefined histories.
+        Delete datasets and dataset collections from a Galaxy history, except the given input datasets.
 
-        This function retrieves the items in a Galaxy history and deletes datasets or dataset collections based on their type.
-        Datasets are permanently purged when deleted.
+        This function purges the items of the Galaxy history in batches with the bulk history contents API,
+        or with a bounded number of concurrent requests on servers without it.
 
-        Returns:
-        - List of IDs for items in the excluded histories that were not deleted.
+        Parameters:
+        - keep_ids (list): The IDs of the datasets to keep, e.g. the uploaded or reused inputs.
 
-        Note:
-        - Excluded histories are identified by their 'hid' (history ID) values 1 and 2.
-        - Datasets are deleted using 'delete_dataset' method, and dataset collections using 'delete_dataset_collection' method.
+        Returns:
+        - List of IDs of the kept datasets, in the order of keep_ids.
         """
+        return self.history_cleaner.clean(history_id=self.history_id, keep_ids=keep_ids)
 
-        excluded_history_ids = [1, 2]
-        excluded_item_ids = []
+    def start_fresh_history(self, history_name: str, keep_ids: List[str]):
+        """
+        Continue in a new history instead of cleaning the current one.
 
-        items = self.gi.histories.show_history(history_id=self.history_id, contents=True, deleted=False, visible=True)
+        The given datasets are copied into a new history with the same name and the old history is
+        purged in the background, so the run does not wait for the cleanup.
 
-        for item in items:
-            hid = item["hid"]
-            item_type = item["type"]
-            item_id = item["id"]
-
-            if hid not in excluded_history_ids:
-                if item_type == "file":
-                    self.gi.histories.delete_dataset(history_id=self.history_id, dataset_id=item_id, purge=True)
-                else:
-                    self.gi.histories.delete_dataset_collection(history_id=self.history_id, dataset_collection_id=item_id)
-            else:
-                excluded_item_ids.append(item_id)
+        Parameters:
+        - history_name (str): The name of the new history.
+        - keep_ids (list): The IDs of the datasets to copy, e.g. the uploaded or reused inputs.
 
-        return excluded_item_ids
+        Returns:
+        - List of IDs of the copies in the new history, in the order of keep_ids.
+        """
+        history = self.history_cleaner.replace_history(
+            history_id=self.history_id, name=history_name, keep_ids=keep_ids
+        )
+        self.history_id = history["id"]
+        return history["kept_ids"]
 
     def workflow_show_invocation(self):
         """
@@ -214,162 +321,669 @@ class GalaxyWorkflow:
         """
         Check and process the state of datasets in the input list.
 
+        The states of all datasets are fetched with a single history contents request per round,
+        and only datasets that changed into a finished state are handed on to the tool probing.
+
         Args:
             input_list (list): List of dataset IDs.
 
         Returns:
             None
         """
-        lst = []
-        while input_list:
-            current_length = len(input_list)
+        if self.results is not None:
+            self.results.start_run(
+                server=self.server, galaxy_version=self.get_galaxy_version(), sampling=self.sampler.strategy
+            )
+
+        if self.checkpoint is not None:
+            self.checkpoint.record_datasets(history_id=self.history_id, dataset_ids=input_list)
+
+        # Follow the state of all datasets with one history contents request per round
+        tracker = DatasetStateTracker(gi=self.gi, history_id=self.history_id, dataset_ids=input_list)
+        try:
+            self.track_datasets(tracker)
+        except KeyboardInterrupt:
+            # Do not start any more tools or combinations, the running ones finish on their own
+            print(f"Cancelled {self.cancel_runs()} pending runs")
+            if self.results is not None:
+                self.results.finish_run()
+            raise
+
+        pprint("Finished")
+        for future in self.tool_pool.join():
+            if future.exception() is not None:
+                print(f"Tool run failed: {future.exception()}")
+        self.export_errors()
+        if self.results is not None:
+            self.results.finish_run()
+        self.print_sampling_summary()
+
+    def track_datasets(self, tracker: DatasetStateTracker):
+        """
+        Poll the tracked datasets until all of them finished and probe the tool of every 'ok' dataset.
+
+        Tools with data table backed inputs are handed to the tool pool, one batch per tool.
+
+        Args:
+            tracker (DatasetStateTracker): The tracker holding the datasets of the workflow.
+
+        Returns:
+            None
+        """
+        while tracker.pending:
             time.sleep(5)
             try:
-                pprint(f"Current Length: {current_length}")
-                for i in input_list:
-                    item = self.gi.datasets.show_dataset(dataset_id=i)
+                pprint(f"Current Length: {len(tracker.pending)}")
+                with self.health.slot():
+                    transitions = tracker.poll()
+                # Only datasets which just changed into a finished state are processed
+                for item, previous_state in transitions:
                     item_state = item["state"]
                     if item_state != "ok":
-                        if item_state not in {"paused", "error"}:
-                            # Append only if the state is neither "paused" nor "error"
-                            lst.append(i)
-                    else:
-                        gt_runner = DatasetModification(gi=self.gi, history_id=self.history_id)
-                        tool_id, tool_input = gt_runner.fetch_dataset_details(item=item)
-
-                        # Do it for every tool just once
-                        if tool_id not in self.my_dict:
-                            self.my_dict[tool_id] = tool_input
-
-                            # Calculate the xml from galaxy webpage of tool
-                            url_link = (self.get_tool_input_options_link(tool_id=tool_id))
-                            tool_name = self.get_tool_input_options_name(tool_id=tool_id)
-                            pprint(tool_name)
-                            pprint(url_link)
-                            html_extractor = HTMLContentExtractor()
-                            html_extractor.capture_html_content(url=url_link)
-                            formatted_xml = html_extractor.extract_and_prettify_xml()
-
-                            # If it hats datatable, run it multithreaded
-                            if "<options from_data_table" in formatted_xml:
-                                thread = threading.Thread(
-                                    target=self.run_tool_multithreaded,
-                                    args=(formatted_xml, tool_id, tool_input, tool_name)
-                                )
-                                thread.start()
+                        print(f"Dataset {item['id']} changed from {previous_state} to {item_state}")
+                        continue
+
+                    gt_runner = DatasetModification(gi=self.gi, history_id=self.history_id)
+                    tool_id, tool_input = gt_runner.fetch_dataset_details(item=item)
+
+                    # Do it for every tool just once
+                    if tool_id not in self.my_dict:
+                        self.my_dict[tool_id] = tool_input
+
+                        tool_name = self.get_tool_input_options_name(tool_id=tool_id)
+                        xml_parser = self.fetch_tool_source(tool_id=tool_id)
+
+                        # If it hats datatable, run it multithreaded
+                        if xml_parser.data_table_params:
+                            run_tool = self.run_tool_in_shard if self.shard_histories else self.run_tool_multithreaded
+                            self.tool_pool.submit(tool_id, run_tool, xml_parser, tool_id, tool_input, tool_name)
 
             except ConnectionError as e:
                 print(f"Failed to connect to Galaxy: {e}")
                 print("Retrying in 2 seconds...")
                 print("workflow_connection")
                 time.sleep(2)  # Wait for 2 seconds before retrying
-
-                # Check all problematic file ids again
-                lst = self.problematic_file_ids
-                print(len(lst), "after exception in workflow_connection")
             finally:
-                # Update input_list to the remaining items after the loop
-                input_list = lst
-                print("Round", len(input_list))
-                lst = []
+                print("Round", len(tracker.pending))
 
-        pprint("Finished")
-        thread.join()
+    def fetch_tool_source(self, tool_id: str) -> XMLParser:
+        """
+        Fetch the raw source of a tool and collect its data table backed params.
+
+        Args:
+            tool_id (str): The ID of the tool.
 
-    def run_tool_multithreaded(self, formatted_xml: str, tool_id: str, tool_input, tool_name: str):
+        Returns:
+            XMLParser: The parser holding the data table backed params of the tool source.
+        """
+        # Calculate the xml from galaxy webpage of tool
+        url_link = self.get_tool_input_options_link(tool_id=tool_id)
+        pprint(self.get_tool_input_options_name(tool_id=tool_id))
+        pprint(url_link)
+        html_extractor = HTMLContentExtractor(cache=self.tool_source_cache, session=self.transport)
+        html_extractor.capture_html_content(
+            url=url_link,
+            tool_id=tool_id,
+            version=self.tool_metadata.get(tool_id=tool_id).version
+        )
+        # Collect the data table backed params in one streaming pass over the raw XML
+        xml_parser = XMLParser()
+        xml_parser.fetch_xml_data(xml_content=html_extractor.extract_xml_content())
+        return xml_parser
+
+    def count_workflow_combinations(self, file_workflow: str):
+        """
+        Count the combinations the tools of a workflow would be probed with, without touching the history.
+
+        The tools are read from the workflow file, including its subworkflows, instead of the datasets
+        of an invocation, so nothing is purged, uploaded, invoked or submitted. An incremental sweep
+        skips the tools which did not change, like plan_tool_run(). The count is taken before
+        combinations with the same tool inputs or tested in an earlier sweep are skipped, as the tool
+        inputs are only known from the datasets of an invocation.
+
+        Args:
+            file_workflow (str): The workflow file.
+
+        Returns:
+            None
+        """
+        self.datatables_name = self.get_names_from_data(data=self.load_data_from_file(file_path=self.file_path))
+        for tool_id in self.get_workflow_tool_ids(workflow=self.load_data_from_file(file_path=file_workflow)):
+            try:
+                tool_name = self.get_tool_input_options_name(tool_id=tool_id)
+                xml_parser = self.fetch_tool_source(tool_id=tool_id)
+            except ConnectionError as e:
+                print(f"Failed to fetch {tool_id}: {e}")
+                continue
+            if not xml_parser.data_table_params:
+                continue
+
+            dictionary, multiple_list = self.get_tool_options(xml_parser=xml_parser, tool_id=tool_id)
+            total_combinations = self.sampler.count(dictionary=dictionary, exclude_keys=multiple_list)
+            if self.change_detector is not None and not self.change_detector.has_changed(
+                tool_id, self.tool_metadata.get(tool_id=tool_id).version, dictionary, self.sampler.get_settings()
+            ):
+                print(f'{tool_name} did not change since the last sweep, skipping it')
+                self.record_sampling_summary(tool_name, total_combinations, 0)
+                continue
+            selected_combinations = self.sampler.sample(dictionary=dictionary, exclude_keys=multiple_list)
+            if self.max_combinations is not None:
+                selected_combinations = islice(selected_combinations, self.max_combinations)
+            print(f'Total combinations for {tool_name}: {total_combinations}')
+            self.record_sampling_summary(tool_name, total_combinations, sum(1 for _ in selected_combinations))
+        self.print_sampling_summary()
+
+    @staticmethod
+    def get_workflow_tool_ids(workflow: Dict) -> List[str]:
+        """
+        Collect the IDs of the tools of a workflow and of its subworkflows.
+
+        Args:
+            workflow (dict): The workflow, as stored in a .ga file.
+
+        Returns:
+            list: The tool IDs in the order of the steps, without duplicates.
+        Example:
+            >>> workflow = {"steps": {
+            ...     "0": {"type": "data_input", "tool_id": None},
+            ...     "1": {"type": "tool", "tool_id": "fastqc"},
+            ...     "2": {"type": "subworkflow", "subworkflow": {"steps": {
+            ...         "0": {"type": "tool", "tool_id": "cutadapt"},
+            ...         "1": {"type": "tool", "tool_id": "fastqc"}
+            ...     }}}
+            ... }}
+            >>> GalaxyWorkflow.get_workflow_tool_ids(workflow)
+            ['fastqc', 'cutadapt']
+        """
+        tool_ids = []
+        for step in workflow.get("steps", {}).values():
+            if step.get("type") == "subworkflow":
+                found = GalaxyWorkflow.get_workflow_tool_ids(step.get("subworkflow", {}))
+            else:
+                found = [step["tool_id"]] if step.get("tool_id") else []
+            tool_ids.extend(tool_id for tool_id in found if tool_id not in tool_ids)
+        return tool_ids
+
+    def cancel_runs(self, tool_id: str | None = None) -> int:
+        """
+        Cancel the tool runs and combination submissions which did not start yet.
+
+        Args:
+            tool_id (str | None): The ID of the tool whose batch is cancelled, None for all tools.
+
+        Returns:
+            int: The number of cancelled tasks.
+        """
+        return self.tool_pool.cancel(tool_id) + self.submission_pool.cancel(tool_id)
+
+    def run_tool_in_shard(self, xml_parser: XMLParser, tool_id: str, tool_input, tool_name: str):
+        """
+        Run all combinations of a tool in a scratch history of the tool.
+
+        The datasets the tool input refers to are copied into the scratch history first, copies share
+        the data of the originals.
+
+        Args:
+            xml_parser (XMLParser): The parser holding the data table backed params of the tool source.
+            tool_id (str): The ID of the tool to be executed.
+            tool_input: The initial tool input.
+            tool_name (str): The name of the tool.
+
+        Returns:
+            None
+        """
+        # A resumed run continues in the scratch history its jobs were submitted to
+        history_id = self.history_shards.get_history(tool_name=tool_name, reuse=self.resume)
+        tool_input = self.history_shards.copy_inputs(history_id=history_id, tool_input=tool_input)
+        print(f'Running {tool_name} in history {self.history_shards.get_name(tool_name)}')
+        self.run_tool_multithreaded(xml_parser, tool_id, tool_input, tool_name, history_id=history_id)
+
+    def run_tool_multithreaded(
+        self,
+        xml_parser: XMLParser,
+        tool_id: str,
+        tool_input,
+        tool_name: str,
+        history_id: str | None = None
+    ):
         """
         Run a tool with multiple combinations of inputs in a multithreaded manner.
 
         Args:
-            formatted_xml (str): The formatted XML content.
+            xml_parser (XMLParser): The parser holding the data table backed params of the tool source.
             tool_id (str): The ID of the tool to be executed.
             tool_input: The initial tool input.
             tool_name (str): The name of the tool.
+            history_id (str | None): The history the jobs run in, None for the main history.
 
         Returns:
             None
         """
-        # Extract databases and process input options
-        unique_databases = self.remove_duplicate(self.find_databases_in_xml(xml_content=formatted_xml))
-        inputs_options = self.get_tool_input_options(tool_id=tool_id)
-        dictionary, multiple_list = self.process_data(unique_databases, inputs_options=inputs_options)
-        multiple_list = self.remove_duplicate(multiple_list)
+        history_id = history_id or self.history_id
+        tool_run = self.plan_tool_run(xml_parser, tool_id, tool_input, tool_name)
+        if tool_run is None:
+            return
+
+        # All jobs of this tool are settled together with the bulk jobs listing of the history
+        watcher = JobSetWatcher(gi=self.gi, history_id=history_id, deadline=self.scheduler.deadline, health=self.health)
+
+        # Submit every combination through the bounded submission pool as soon as it is generated
+        selected_combinations = 0
+        resumed_combinations = 0
+        for combination, inp, updated_input in tool_run["tool_inputs"]:
+            selected_combinations += 1
+            if self.resume_combination(watcher=watcher, tool_id=tool_id, entry=updated_input):
+                resumed_combinations += 1
+                continue
+            self.submission_pool.submit(
+                tool_id,
+                self.submit_combination,
+                watcher,
+                tool_id,
+                tool_name,
+                inp,
+                updated_input,
+                combination,
+                tool_run["tool_row"],
+                history_id,
+                tool_run
+            )
+        self.record_sampling_summary(tool_name, tool_run["total"], selected_combinations)
+        if resumed_combinations:
+            print(f'{resumed_combinations} combinations of {tool_name} taken over from the interrupted run')
 
-        # Generate combinations of inputs
-        all_combinations = self.generate_combinations(dictionary=dictionary, exclude_keys=multiple_list)
-        input_list = [self.update_keys(tool_input.copy(), combination) for combination in all_combinations]
+        # Jobs are watched while the submissions are still running, stop once the last one returned
+        self.submission_pool.on_batch_done(tool_id, watcher.close)
 
-        # Display total combinations
-        print(f'Total combinations for {tool_name}: {len(input_list)}')
-
-        # Execute tool with each combination
-        job_id_list = []
-        for inp in input_list:
-            updated_input = self.update_values(dic=inp, key="id", new_values="Test ids 3")
-            updated_input = self.update_values(
-                dic=updated_input,
-                key="__workflow_invocation_uuid__",
-                new_values="Test workflow_invocation-uuid 3"
+        # Handle errors in the order in which the jobs finish
+        for job_id, completion_status, entry in watcher.watch():
+            self.record_job_state(tool_run, job_id=job_id, completion_status=completion_status, entry=entry)
+
+        self.finish_tool_run(tool_run, selected_combinations=selected_combinations)
+
+    def plan_tool_run(self, xml_parser: XMLParser, tool_id: str, tool_input, tool_name: str) -> Dict | None:
+        """
+        Select the combinations of a tool which are submitted.
+
+        Args:
+            xml_parser (XMLParser): The parser holding the data table backed params of the tool source.
+            tool_id (str): The ID of the tool to be executed.
+            tool_input: The initial tool input.
+            tool_name (str): The name of the tool.
+
+        Returns:
+            dict | None: The tool run, with the lazily generated tool inputs under 'tool_inputs', None if
+            nothing is submitted, because the tool did not change or this is a dry run.
+        """
+        dictionary, multiple_list = self.get_tool_options(xml_parser=xml_parser, tool_id=tool_id)
+        total_combinations = self.sampler.count(dictionary=dictionary, exclude_keys=multiple_list)
+        version = self.tool_metadata.get(tool_id=tool_id).version
+
+        # An incremental sweep skips tools whose version, data table options and sampling did not change
+        sampling = self.sampler.get_settings()
+        if self.change_detector is not None and not self.change_detector.has_changed(tool_id, version, dictionary, sampling):
+            print(f'{tool_name} did not change since the last sweep, skipping it')
+            self.record_sampling_summary(tool_name, total_combinations, 0)
+            return None
+
+        # Generate the combinations selected by the sampling strategy lazily, only as many as are submitted
+        all_combinations = self.sampler.sample(dictionary=dictionary, exclude_keys=multiple_list)
+        tool_inputs = self.iter_tool_inputs(tool_input=tool_input, combinations=all_combinations)
+        if self.change_detector is not None:
+            # Combinations tested with this tool version in an earlier sweep are not run again
+            tool_inputs = (
+                item for item in tool_inputs if not self.change_detector.is_tested(tool_id, version, item[2])
             )
+        if self.max_combinations is not None and total_combinations > self.max_combinations:
+            print(f'Limiting {tool_name} to {self.max_combinations} of its combinations')
+            tool_inputs = islice(tool_inputs, self.max_combinations)
 
-            try:
-                # Run tool and get job information
-                job = self.gi.tools.run_tool(
-                    history_id=self.history_id,
-                    tool_id=tool_id,
-                    tool_inputs=inp,
-                    input_format="21.01"
-                )
-                job_id = job["jobs"][0]["id"]
-                job_id_list.append([job_id, updated_input])
-
-            except Exception as e:
-                # Handle tool execution exception
-                print(tool_name, "Exception")
-                self.handle_error_entry(entry=updated_input, error_message=str(e), tool_name=tool_name)
-        # Wait for job completion and handle errors
-        for job_info in job_id_list:
-            completion_status = self.wait_for_job_completion(job_info[0])
-            print(tool_name, completion_status)
-            if completion_status == "error":
-                self.handle_error_entry(
-                    entry=job_info[1],
-                    tool_name=tool_name,
-                    error_message=f"Job has {completion_status} state"
+        # Display total combinations
+        print(f'Total combinations for {tool_name}: {total_combinations}')
+        if self.dry_run:
+            self.record_sampling_summary(tool_name, total_combinations, sum(1 for _ in tool_inputs))
+            return None
+
+        # Every combination and job of the tool version is recorded in the results database
+        tool_row = None
+        if self.results is not None:
+            tool_row = self.results.get_tool(tool_id, version, tool_name)
+
+        return {
+            "tool_id": tool_id,
+            "tool_name": tool_name,
+            "version": version,
+            "options": dictionary,
+            "sampling": sampling,
+            "total": total_combinations,
+            "tool_inputs": tool_inputs,
+            "tool_row": tool_row,
+            # Combinations which were not submitted or whose job did not reach a terminal state
+            "unsettled": 0
+        }
+
+    def get_tool_options(self, xml_parser: XMLParser, tool_id: str) -> tuple:
+        """
+        Collect the options of the data table backed params of a tool.
+
+        Args:
+            xml_parser (XMLParser): The parser holding the data table backed params of the tool source.
+            tool_id (str): The ID of the tool.
+
+        Returns:
+            tuple: The options of every param, and the params which accept multiple options.
+        """
+        # Extract databases and process input options
+        unique_databases = self.find_databases_in_xml(xml_parser=xml_parser)
+        # Index the select params of the tool once, every database param is then a lookup
+        select_index = SelectParameterIndex(inputs=self.get_tool_input_options(tool_id=tool_id))
+        return self.process_data(unique_databases, select_index=select_index)
+
+    def record_job_state(self, tool_run: Dict, job_id: str, completion_status: str, entry: Dict):
+        """
+        Record the final state of a job, failed combinations are added to the error log of the tool.
+
+        Args:
+            tool_run (dict): The tool run, as returned by plan_tool_run().
+            job_id (str): The ID of the Galaxy job.
+            completion_status (str): The final state of the job.
+            entry (dict): The inputs recorded for the combination.
+
+        Returns:
+            None
+        """
+        tool_id = tool_run["tool_id"]
+        print(tool_run["tool_name"], completion_status)
+        error_message = None
+        if completion_status in {"error", PollScheduler.DEADLINE_EXCEEDED}:
+            error_message = f"Job has {completion_status} state"
+            self.handle_error_entry(entry=entry, tool_name=tool_run["tool_name"], error_message=error_message)
+        if self.results is not None:
+            self.results.finish_job(job_id=job_id, state=completion_status, error_message=error_message)
+        # A job past the deadline may still finish, a resumed run watches it again
+        if self.checkpoint is not None and completion_status in JobSetWatcher.TERMINAL_STATES:
+            self.checkpoint.record_state(tool_id=tool_id, entry=entry, job_id=job_id, state=completion_status)
+        if self.change_detector is not None and completion_status in JobSetWatcher.TERMINAL_STATES:
+            self.change_detector.mark_tested(tool_id=tool_id, version=tool_run["version"], entry=entry)
+        if completion_status not in JobSetWatcher.TERMINAL_STATES:
+            self.count_unsettled(tool_run)
+
+    def count_unsettled(self, tool_run: Dict):
+        """
+        Count a combination of a tool run which was not tested, so the tool is probed again by the next sweep.
+
+        Args:
+            tool_run (dict): The tool run, as returned by plan_tool_run().
+
+        Returns:
+            None
+        """
+        with self.error_lock:
+            tool_run["unsettled"] += 1
+
+    def finish_tool_run(self, tool_run: Dict, selected_combinations: int):
+        """
+        Store the fingerprint of a tool once all its jobs are settled.
+
+        Args:
+            tool_run (dict): The tool run, as returned by plan_tool_run().
+            selected_combinations (int): The number of combinations selected for submission.
+
+        Returns:
+            None
+        """
+        # Only a sweep which was not cut short by the limit and tested every selected combination
+        # covers the current options, failed submissions and jobs past the deadline are retried next time
+        if self.change_detector is not None:
+            capped = self.max_combinations is not None and selected_combinations >= self.max_combinations
+            if not capped and tool_run["unsettled"] == 0:
+                self.change_detector.finish_tool(
+                    tool_id=tool_run["tool_id"],
+                    version=tool_run["version"],
+                    options=tool_run["options"],
+                    sampling=tool_run["sampling"]
                 )
+            else:
+                self.change_detector.save()
 
-    def find_databases_in_xml(self, xml_content):
+    def resume_combination(self, watcher: JobSetWatcher, tool_id: str, entry: Dict) -> bool:
         """
-        Extract a list of database names from XML content.
+        Take over a combination submitted by an interrupted run instead of submitting it again.
 
-        This function uses an XMLParser to fetch data from the provided XML content and extracts
-        database names based on the list of datatables names stored in the class instance.
+        Combinations whose job finished are skipped, jobs which were still running are added to the watcher.
 
-        Parameters:
-        - xml_content (str): The XML content to parse and extract database names from.
+        Args:
+            watcher (JobSetWatcher): The watcher settling the jobs of the tool.
+            tool_id (str): The ID of the tool.
+            entry (dict): The inputs recorded for the combination.
 
         Returns:
-        - List of unique database names found in the XML content.
+            bool: True if the combination was submitted before and must not be submitted again.
         """
+        if self.checkpoint is None or not self.resume:
+            return False
+        recorded = self.checkpoint.get(tool_id=tool_id, entry=entry)
+        if recorded is None:
+            return False
+        if recorded["state"] is None:
+            watcher.add(recorded["job_id"], entry, submitted_at=recorded.get("submitted_at"))
+        return True
+
+    def get_resume_datasets(self) -> List[str] | None:
+        """
+        Return the datasets tracked by the interrupted run in the current history.
 
-        # Initialize an empty list to store database names
-        database_names_list = []
+        The history is kept as it is, so the data table names the workflow run would have loaded are loaded here.
 
-        # Create an instance of the XMLParser class
-        xml_parser = XMLParser()
+        Returns:
+            list | None: The dataset IDs, None if there is no run to resume.
+        """
+        if self.checkpoint is None or not self.resume:
+            return None
+        dataset_ids = self.checkpoint.get_datasets(history_id=self.history_id)
+        if dataset_ids is not None:
+            self.datatables_name = self.get_names_from_data(data=self.load_data_from_file(file_path=self.file_path))
+        return dataset_ids
+
+    def record_sampling_summary(self, tool_name: str, total: int, selected: int):
+        """
+        Record how many of the exhaustive combinations of a tool were selected by the sampling strategy.
+
+        Args:
+            tool_name (str): The name of the tool.
+            total (int): The number of exhaustive combinations.
+            selected (int): The number of combinations selected for submission.
+
+        Returns:
+            None
+        """
+        self.sampling_summary[tool_name] = {
+            "strategy": self.sampler.strategy,
+            "total": total,
+            "selected": selected,
+            "saved": total - selected
+        }
+
+    def print_sampling_summary(self):
+        """
+        Print the selected and saved jobs of every tool and of the whole run.
+
+        Returns:
+            None
+        """
+        for tool_name, summary in self.sampling_summary.items():
+            print(
+                f"{tool_name}: {summary['selected']} of {summary['total']} combinations with "
+                f"{summary['strategy']} sampling, {summary['saved']} jobs saved"
+            )
+        saved = sum(summary["saved"] for summary in self.sampling_summary.values())
+        print(f"Jobs saved by {self.sampler.strategy} sampling: {saved}")
+
+    def iter_tool_inputs(self, tool_input: Dict, combinations: Iterator[Dict]) -> Iterator[tuple]:
+        """
+        Yield the patched tool inputs for every distinct payload, one at a time.
 
-        # Fetch XML data using the XMLParser
-        xml_parser.fetch_xml_data(xml_content=xml_content)
+        The key paths of the template are resolved once, every payload then only copies the containers
+        along the changed paths and shares the rest with the template, so payloads must not be modified.
+        Combinations whose keys are not in the template, e.g. params of an unselected conditional, leave
+        the payload unchanged, so a payload equal to an earlier one is skipped instead of submitting the
+        same job again.
 
-        # Iterate through the list of datatables names
-        for database in self.datatables_name:
-            # Append the result of finding databases names to the list
-            database_names_list.append(xml_parser.find_databases_names(database))
+        Args:
+            tool_input (dict): The tool input of the workflow run, used as template.
+            combinations (Iterator[dict]): The combinations of database values.
+
+        Yields:
+            tuple: The combination, the inputs submitted to Galaxy and the inputs recorded if the
+            combination fails, where dataset IDs and the invocation UUID are replaced by placeholders.
+        """
+        patcher = InputPatcher(template=tool_input)
+        placeholders = {"id": "Test ids 3", "__workflow_invocation_uuid__": "Test workflow_invocation-uuid 3"}
+        seen = set()
+        duplicates = 0
+        for combination in combinations:
+            payload = patcher.apply(combination)
+            payload_hash = self.get_hash(payload)
+            if payload_hash in seen:
+                duplicates += 1
+                continue
+            seen.add(payload_hash)
+            yield combination, payload, patcher.apply(combination | placeholders)
+        if duplicates:
+            print(f"Skipped {duplicates} combinations with the same tool inputs as an earlier one")
+
+    def get_hash(self, value: Any) -> str:
+        """
+        Hash the canonical JSON form of a value.
+
+        Args:
+            value: The value to hash.
+
+        Returns:
+            str: The sha256 of the value.
+        """
+        canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def submit_combination(
+        self,
+        watcher: JobSetWatcher,
+        tool_id: str,
+        tool_name: str,
+        tool_inputs: Dict,
+        entry: Dict,
+        combination: Dict | None = None,
+        tool_row: int | None = None,
+        history_id: str | None = None,
+        tool_run: Dict | None = None
+    ):
+        """
+        Run a tool with one combination of inputs and add the job to the watcher.
 
-        # Flatten the list and remove duplicates
-        result_list = self.flatten(self.remove_duplicate(original_list=database_names_list))
+        Args:
+            watcher (JobSetWatcher): The watcher settling the jobs of the tool.
+            tool_id (str): The ID of the tool to be executed.
+            tool_name (str): The name of the tool.
+            tool_inputs (dict): The inputs submitted to Galaxy.
+            entry (dict): The inputs recorded if the combination fails.
+            combination (dict | None): The database values of the combination, recorded in the results database.
+            tool_row (int | None): The row of the tool version in the results database.
+            history_id (str | None): The history the job runs in, None for the main history.
+            tool_run (dict | None): The tool run the combination belongs to.
+
+        Returns:
+            None
+        """
+        try:
+            # Run tool and get job information
+            job = self.gi.tools.run_tool(
+                history_id=history_id or self.history_id,
+                tool_id=tool_id,
+                tool_inputs=tool_inputs,
+                input_format="21.01"
+            )
+            job_id = job["jobs"][0]["id"]
+            self.record_submission(tool_id, entry, job_id, combination, tool_row)
+            watcher.add(job_id, entry)
 
-        return result_list
+        except Exception as e:
+            # Handle tool execution exception
+            self.record_submission_error(tool_name, entry, str(e), combination, tool_row, tool_run)
+
+    def record_submission(
+        self, tool_id: str, entry: Dict, job_id: str, combination: Dict | None = None, tool_row: int | None = None
+    ):
+        """
+        Record the job of a submitted combination in the checkpoint journal and the results database.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            entry (dict): The inputs recorded for the combination.
+            job_id (str): The ID of the Galaxy job.
+            combination (dict | None): The database values of the combination.
+            tool_row (int | None): The row of the tool version in the results database.
+
+        Returns:
+            None
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.record_submission(tool_id=tool_id, entry=entry, job_id=job_id)
+        if self.results is not None and tool_row is not None:
+            self.results.add_job(tool_row=tool_row, combination=combination or {}, entry=entry, job_id=job_id)
+
+    def record_submission_error(
+        self,
+        tool_name: str,
+        entry: Dict,
+        error_message: str,
+        combination: Dict | None = None,
+        tool_row: int | None = None,
+        tool_run: Dict | None = None
+    ):
+        """
+        Record a combination which Galaxy refused to run.
+
+        Args:
+            tool_name (str): The name of the tool.
+            entry (dict): The inputs recorded for the combination.
+            error_message (str): The error of the submission.
+            combination (dict | None): The database values of the combination.
+            tool_row (int | None): The row of the tool version in the results database.
+            tool_run (dict | None): The tool run the combination belongs to.
+
+        Returns:
+            None
+        """
+        print(tool_name, "Exception")
+        if tool_run is not None:
+            self.count_unsettled(tool_run)
+        if self.results is not None and tool_row is not None:
+            self.results.add_job(
+                tool_row=tool_row,
+                combination=combination or {},
+                entry=entry,
+                job_id=None,
+                state="submit_error",
+                error_message=error_message
+            )
+        self.handle_error_entry(entry=entry, error_message=error_message, tool_name=tool_name)
+
+    def find_databases_in_xml(self, xml_parser: XMLParser):
+        """
+        Extract a list of database names from parsed XML content.
+
+        This function uses the data table backed params collected by the XMLParser and extracts
+        database names based on the list of datatables names stored in the class instance.
+
+        Parameters:
+        - xml_parser (XMLParser): The parser which already fetched the tool XML.
+
+        Returns:
+        - List of unique database names found in the XML content.
+        """
+
+        # Look up all datatables names at once in the data table index of the parser
+        return xml_parser.find_databases_names_for(self.datatables_name)
 
     def get_history_id(self, history_name: str) -> str:
         """
@@ -399,6 +1013,7 @@ class GalaxyWorkflow:
 
         # Store the history_id in the class instance
         self.history_id = history_id
+        self.history_shards = HistoryShards(gi=self.gi, base_name=history_name, cleaner=self.history_cleaner)
 
         # Return the retrieved history_id
         return history_id
@@ -420,11 +1035,8 @@ class GalaxyWorkflow:
         Returns:
         - input_options: Detailed input options for the tool.
         """
-        # Show the tool with detailed input and output options
-        tool_details = self.gi.tools.show_tool(tool_id=tool_id, io_details=True)
-        # Extract detailed input options
-        input_options = tool_details.get('inputs', {})
-        return input_options
+        # Detailed input options are part of the cached tool metadata
+        return self.tool_metadata.get(tool_id=tool_id).inputs
 
     def get_tool_input_options_link(self, tool_id: str):
         """
@@ -447,14 +1059,8 @@ class GalaxyWorkflow:
             https://usegalaxy.eu/api/tools/toolshed.g2.bx.psu.edu/repos/lparsons/cutadapt/cutadapt/4.6+galaxy1/raw_tool_source
         """
 
-        # Retrieve tool details using the Galaxy API
-        tool_details = self.gi.tools.show_tool(tool_id=tool_id, io_details=True, link_details=True)
-
-        # Extract input options link from the tool details
-
-        tool_id = tool_details.get("id", {})
-        link = f'{self.server}api/tools/{tool_id}/raw_tool_source'
-        return link
+        # Retrieve tool details from the tool metadata cache
+        return self.tool_metadata.get(tool_id=tool_id).link
 
     def get_tool_input_options_name(self, tool_id: str):
         """
@@ -474,52 +1080,8 @@ class GalaxyWorkflow:
             >>> print(tool_name)
             Cutadapt
         """
-        # Retrieve tool details using the Galaxy API
-        tool_details = self.gi.tools.show_tool(tool_id=tool_id, io_details=True, link_details=True)
-
-        # Extract the name of the tool
-        tool_name = tool_details.get('name', {})
-
-        return tool_name
-
-    def extract_database_names(self, inputs: List) -> List:
-        """
-        Extracts and returns a list of database names from a list containing
-        information about each database. The input list should follow the pattern
-        [name, database_name, selected, ...] for each database.
-
-        Args:
-        - inputs (List): List containing information about databases.
-
-        Returns:
-        - List: List of database names.
-
-        Example:
-            >>> server = 'https://usegalaxy.eu/'
-            >>> api_key = 'YOUR_API_KEY' # Replace 'API_KEY_PLACEHOLDER' with the actual API key
-            >>> instance = Tool(server, api_key)
-            >>> sample_inputs = [
-            ...     'rfam-5s-database-id98', '2.1b-rfam-5s-database-id98', False,
-            ...     'silva-arc-23s-id98', '2.1b-silva-arc-23s-id98', False,
-            ...     'silva-euk-28s-id98', '2.1b-silva-euk-28s-id98', False,
-            ...     'silva-bac-23s-id98', '2.1b-silva-bac-23s-id98', False,
-            ...     'silva-euk-18s-id95', '2.1b-silva-euk-18s-id95', False,
-            ...     'silva-bac-16s-id90', '2.1b-silva-bac-16s-id90', False,
-            ...     'rfam-5.8s-database-id98', '2.1b-rfam-5.8s-database-id98', False,
-            ...     'silva-arc-16s-id95', '2.1b-silva-arc-16s-id95', False
-            ... ]
-            >>> result = instance.extract_database_names(sample_inputs)
-            >>> pprint(result)
-            ['2.1b-rfam-5s-database-id98',
-             '2.1b-silva-arc-23s-id98',
-             '2.1b-silva-euk-28s-id98',
-             '2.1b-silva-bac-23s-id98',
-             '2.1b-silva-euk-18s-id95',
-             '2.1b-silva-bac-16s-id90',
-             '2.1b-rfam-5.8s-database-id98',
-             '2.1b-silva-arc-16s-id95']
-        """
-        return [inputs[i] for i in range(1, len(inputs), 3)]
+        # Retrieve tool details from the tool metadata cache
+        return self.tool_metadata.get(tool_id=tool_id).name
 
     def remove_duplicate(self, original_list: List):
         """
@@ -552,135 +1114,29 @@ class GalaxyWorkflow:
 
         return unique_list
 
-    def extract_values_from_nested_json(self, json_object: Any, target_key):
-        """
-        Recursively fetch values from nested JSON based on a specified key.
-
-        Args:
-            json_object (dict or list): The JSON object to search.
-            target_key (str): The key to search for in the JSON object.
-
-        Returns:
-            list: A list of values corresponding to the specified key in the JSON object.
-        """
-        result_values = []
-        result_muliple = []
-
-        def recursive_search(obj, result_values, key):
-            """
-            Recursively searches for values of key in JSON tree.
-
-            Args:
-                obj (dict or list): The current JSON object or list.
-                result_values (list): The list to store found values.
-                key (str): The target key to search for.
-
-            Returns:
-                list: A list of values corresponding to the specified key.
-            """
-            if isinstance(obj, dict):
-                for _, v in obj.items():
-                    if isinstance(v, (dict, list)):
-                        recursive_search(v, result_values, key)
-                    if v == key and obj.get("model_class") == 'SelectToolParameter':
-                        options = obj.get("options", {})
-                        result_values.append(options)
-                        if obj.get('multiple') is True:
-                            result_muliple.append(key)
-            elif isinstance(obj, list):
-                for item in obj:
-                    recursive_search(item, result_values, key)
-            return result_values
-
-        found_values = recursive_search(json_object, result_values, target_key)
-        return found_values, result_muliple
-
-    def update_keys(self, original, updated):
+    def process_data(self, keys: List, select_index: SelectParameterIndex):
         """
-        Update values in the original dictionary with values from the updated dictionary.
-
-        This function takes two dictionaries as input, the original and the updated,
-        and updates the values in the original dictionary with the corresponding values
-        from the updated dictionary.
+        Process data for a list of keys and look up their database names in the select param index.
 
         Parameters:
-        - original (dict): The original dictionary to be updated.
-        - updated (dict): The dictionary containing values to update the original dictionary.
+        - keys (List): A list of select param names.
+        - select_index (SelectParameterIndex): The index built once from the detailed tool inputs.
 
         Returns:
-        - dict: The original dictionary with updated values.
-        """
-
-        for key, value in updated.items():
-            original = self.update_values(original, key=key, new_values=value)
-
-        return original
-
-    def process_data(self, keys: List, inputs_options: Any):
-        """
-        Process data for a list of keys and extract database names from nested JSON.
-
-        Parameters:
-        - keys (List): A list of keys to extract values from the nested JSON.
-        - inputs_options (Any): The nested JSON structure containing the data.
-
-        Returns:
-        Tuple[Dict, List]: A tuple containing a dictionary with processed data for each key
-        and a list of multiple values encountered during extraction
+        Tuple[Dict, List]: A tuple containing a dictionary with the database names of each key
+        and a list of the keys which accept multiple values
         """
         result_dict = {}
         multiple_values = []
         for key in keys:
-            # Extract values based on the key
-            extracted_values, multiple_values = self.extract_values_from_nested_json(inputs_options, key)
-
-            # Check if the extracted values are not empty
-            if extracted_values:
-                flattened_values = self.flatten(extracted_values)
-                databases = self.remove_duplicate(original_list=self.extract_database_names(inputs=flattened_values))
-                result_dict[key] = databases
+            # Only keys which are select params of the tool are kept
+            if select_index.get(key):
+                result_dict[key] = select_index.get_databases(key)
+                if select_index.is_multiple(key):
+                    multiple_values.append(key)
 
         return result_dict, multiple_values
 
-    def update_values(self, dic: Dict, key: str, new_values: Any):
-        """
-        Recursively updates values in a nested dictionary based on a specified key.
-
-        Args:
-            dic (dict): The original dictionary.
-            key (str): The key to update in the dictionary.
-            new_values: The new values to assign to the matching key.
-
-        Returns:
-            dict: The updated dictionary.
-
-        Example:
-            >>> server = 'https://usegalaxy.eu/'
-            >>> api_key = 'YOUR_API_KEY' # Replace 'API_KEY_PLACEHOLDER' with the actual API key
-            >>> instance = Tool(server, api_key)
-            >>> original_dict = {'a': 1, 'b': {'c': 2, 'd': {'e': 3}}}
-            >>> updated_dict = instance.update_values(original_dict, 'd', {'new_value': 4})
-            >>> print(updated_dict)
-            {'a': 1, 'b': {'c': 2, 'd': {'new_value': 4}}}
-        """
-        # Make a deep copy to preserve the original dictionary
-        dictionary = copy.deepcopy(dic)
-
-        def recursion(d, k, new_val):
-            if isinstance(d, dict):
-                for k_inner, v_inner in d.items():
-                    if isinstance(v_inner, (dict, list)):
-                        recursion(v_inner, k, new_val)
-                    if k_inner == k:
-                        d[k_inner] = new_val
-            elif isinstance(d, list):
-                for item in d:
-                    recursion(item, k, new_val)
-
-        recursion(dictionary, key, new_values)
-
-        return dictionary
-
     def flatten(self, nested_list: List):
         """
         Flatten a nested list recursively.
@@ -747,138 +1203,65 @@ class GalaxyWorkflow:
 
         return [entry['name'] for entry in data]
 
-    def generate_combinations(self, dictionary: Dict, exclude_keys: List):
+    def get_error_store(self, tool_name: str) -> ErrorStore:
         """
-        Generate combinations of key-value pairs from a dictionary, excluding specified keys.
-
-        This method takes a dictionary and a list of keys to exclude. It generates combinations
-        of key-value pairs from the remaining keys in the dictionary after excluding the specified keys.
+        Return the error store of a tool, opening it on first use.
 
         Args:
-            dictionary (dict): The original dictionary to generate combinations from.
-            exclude_keys (list): The list of keys to exclude from the combinations.
+            tool_name (str): The name of the tool.
 
         Returns:
-            list: A list of dictionaries representing different combinations of key-value pairs.
-        Example:
-            >>> server = 'https://usegalaxy.eu/'
-            >>> api_key = 'YOUR_API_KEY' # Replace 'API_KEY_PLACEHOLDER' with the actual API key
-            >>> instance = Tool(server, api_key)
-            >>> original_dict = {'a': [1, 2], 'b': [3, 4], 'c': [5, 6]}
-            >>> exclude_keys = ['a']
-            >>> combinations = instance.generate_combinations(original_dict, exclude_keys)
-            >>> pprint(combinations)
-            [{'a': [1, 2], 'b': 3, 'c': 5},
-             {'a': [1, 2], 'b': 3, 'c': 6},
-             {'a': [1, 2], 'b': 4, 'c': 5},
-             {'a': [1, 2], 'b': 4, 'c': 6}]
+            ErrorStore: The store shared by all threads reporting errors of the tool.
         """
-        # Prepare an empty dictionary to store the excluded key-value pairs
-        excluded_dict = {}
-
-        # Create a copy of the original dictionary for manipulation
-        remaining_dict = dictionary.copy()
-
-        # Move the excluded keys and their values to the excluded_dict
-        for key in exclude_keys:
-            excluded_dict[key] = remaining_dict.pop(key)
+        with self.error_lock:
+            if tool_name not in self.error_stores:
+                self.error_stores[tool_name] = ErrorStore(tool_name=tool_name)
+            return self.error_stores[tool_name]
 
-        # Generate combinations of the remaining values
-        remaining_combinations = [dict(zip(remaining_dict.keys(), values)) for values in product(*remaining_dict.values())]
-
-        # Merge the excluded_dict with each remaining combination
-        all_combinations = [combination | excluded_dict for combination in remaining_combinations]
-
-        # Return the final list of combinations
-        return all_combinations
-
-    def is_entry_present(self, data: List, entry: Dict):
+    def handle_error_entry(self, tool_name: str, entry, error_message: str):
         """
-        Check if a specific entry is present in a list of dictionaries, ignoring the timestamp.
+        Handle an error entry for a specific tool by appending it to the error log of the tool.
 
-        This method iterates through a list of dictionaries and checks if the 'input' key
-        in any dictionary matches the provided entry, ignoring the timestamp.
+        Entries whose input was stored before are skipped, the check is a lookup of the input hash.
 
         Args:
-            data (list): A list of dictionaries.
-            entry: The entry to check for in the 'input' key.
+            tool_name (str): The name of the tool associated with the error entry.
+            entry: The entry to be added to the error log.
+            error_message (str): The error message associated with the entry.
 
         Returns:
-            bool: True if the entry is present (ignoring timestamp), False otherwise.
+            None
         """
-        # Check if the entry is present (ignoring timestamp)
-        for i in data:
-            if i.get("input") == entry:
-                return True
-        return False
+        self.get_error_store(tool_name).add(entry=entry, error_message=error_message)
 
-    def add_entry_to_json(self, entry: Dict, file_path: str, error_message: str):
+    def export_errors(self):
         """
-        Add an entry to a JSON file, handling the presence of the entry and updating timestamps.
-
-        This method loads existing JSON data from the specified file, checks if the provided entry
-        is already present (ignoring timestamp), and adds the entry with a new timestamp and error message
-        if it's not present. If the file doesn't exist, it initializes an empty list and adds the entry.
-
-        Args:
-            entry: The entry to be added to the JSON file.
-            file_path (str): The path to the JSON file.
-            error_message (str): The error message associated with the entry.
+        Write the errors of every tool to its '{tool_name}_incorrect_combination.json' array file.
 
         Returns:
             None
         """
-        # Load existing JSON data
-        try:
-            with open(file_path, 'r') as json_file:
-                data = json.load(json_file)
-        except FileNotFoundError:
-            # If the file doesn't exist, initialize an empty list
-            data = []
-
-        # Check if the entry is already present (ignoring timestamp)
-        if not self.is_entry_present(data=data, entry=entry):
-            # Add the entry to the data with a new timestamp
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            data_entry = {
-                "timestamp": timestamp,
-                "error_message": error_message,
-                "input": entry
-            }
-            if isinstance(data, list):
-                data.append(data_entry)
-            else:
-                data = [data_entry]
-
-            # Write the updated data back to the JSON file
-            with open(file_path, 'w') as json_file:
-                json.dump(data, json_file, indent=2)
+        with self.error_lock:
+            stores = list(self.error_stores.values())
+        for store in stores:
+            print(f"Errors of {store.tool_name} written to {store.export_json()}")
 
-    def handle_error_entry(self, tool_name: str, entry, error_message: str):
+    def save_caches(self):
         """
-        Handle an error entry for a specific tool by adding it to a tool-specific JSON file.
-
-        This method generates a tool-specific JSON file path based on the tool name, and then
-        calls the 'add_entry_to_json' method to add the provided entry along with the error message
-        to the JSON file. If the file doesn't exist, it initializes an empty list and adds the entry.
-
-        Args:
-            tool_name (str): The name of the tool associated with the error entry.
-            entry: The entry to be added to the JSON file.
-            error_message (str): The error message associated with the entry.
+        Write the parts of the caches which are kept in memory during a run.
 
         Returns:
             None
         """
-        file_path = f'{tool_name}_incorrect_combination.json'
-        self.add_entry_to_json(entry=entry, file_path=file_path, error_message=error_message)
+        if self.tool_source_cache is not None:
+            self.tool_source_cache.flush()
 
     def wait_for_job_completion(self, job_id: str):
         """
         Wait for the completion of a Galaxy job.
 
-        This function continuously checks the state of a Galaxy job until it's not in a 'queued', 'running', or 'new' state.
-        It waits for 5 seconds between each check.
+        The job is registered with the shared poll scheduler, which checks its state with an increasing
+        interval until it's not in a 'queued', 'running', or 'new' state or the deadline passed.
 
         Parameters:
         - job_id (str): The ID of the Galaxy job to monitor.
@@ -886,17 +1269,4 @@ class GalaxyWorkflow:
         Returns:
         - str: The final state of the job.
         """
-        while True:
-            try:
-                job_info = self.gi.jobs.show_job(job_id)
-
-                if job_info['state'] not in {'queued', 'running', 'new'}:
-                    return job_info['state']
-
-                time.sleep(5)
-
-            except ConnectionError as e:
-                print(f"Failed to connect to Galaxy: {e}")
-                print("Retrying in 2 seconds...")
-                print("Job")
-                time.sleep(2)
\ No newline at end of file
+        return self.scheduler.watch_job(job_id).result()
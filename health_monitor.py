@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+import requests
+from bioblend import ConnectionError
+from contextlib import asynccontextmanager, contextmanager
+from poll_scheduler import Backoff
+from urllib.parse import urlsplit
+
+
+class HealthMonitor:
+    # Circuit breaker states
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        gi,
+        interval: float = 60.0,
+        latency_threshold: float = 20.0,
+        failure_threshold: int = 3,
+        max_concurrency: int = 16,
+        retry_initial: float = 5.0,
+        retry_max: float = 120.0
+    ):
+        """
+        Initialize the HealthMonitor class.
+
+        A circuit breaker in front of the Galaxy server. Every request of the shared transport counts
+        as healthy or failed, and a background thread probes config.get_version(), so an outage is
+        noticed by the first requests failing. After failure_threshold failed or slow requests in a
+        row the circuit opens and every gated component, i.e. submissions and polling, waits. While
+        open, the server is probed with a growing interval until it answers in time. The circuit then
+        becomes half-open and lets through one request at a time, twice as many after every round
+        of successful requests, until it closes again at max_concurrency.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            interval (float): Seconds between two probes while the circuit is closed or half-open.
+            latency_threshold (float): Seconds after which a request counts as failed.
+            failure_threshold (int): Number of failed requests in a row opening the circuit.
+            max_concurrency (int): Number of concurrent requests at which a half-open circuit closes.
+            retry_initial (float): Seconds before the first probe of an open circuit.
+            retry_max (float): Upper bound in seconds for the interval between probes of an open circuit.
+        """
+        self.gi = gi
+        self.host = urlsplit(gi.url).netloc
+        self.interval = interval
+        self.latency_threshold = latency_threshold
+        self.failure_threshold = failure_threshold
+        self.max_concurrency = max_concurrency
+        self.backoff = Backoff(initial=retry_initial, maximum=retry_max)
+
+        self.state = self.CLOSED
+        self.failures = 0  # Failed requests in a row
+        self.limit = max_concurrency  # Requests let through at the same time while half-open
+        self.successes = 0  # Successful requests at the current half-open limit
+        self.in_flight = 0
+        self.latency: float | None = None  # Latency of the last successful probe
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start probing the server in a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop probing the server.
+        """
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.backoff.next_delay() if self.state == self.OPEN else self.interval):
+            self.probe()
+
+    def probe(self) -> bool:
+        """
+        Measure the latency of config.get_version().
+
+        The probe request itself is counted by the transport like every other request, so a failing
+        probe adds to the failures. A healthy probe of an open circuit makes it half-open.
+
+        Returns:
+            bool: Whether the server answered in time.
+        """
+        start = time.monotonic()
+        try:
+            self.gi.config.get_version()
+        except (ConnectionError, requests.exceptions.RequestException) as e:
+            print(f"Galaxy health probe failed: {e}")
+            return False
+        latency = time.monotonic() - start
+        healthy = latency <= self.latency_threshold
+
+        with self._condition:
+            if healthy:
+                self.latency = latency
+            if healthy and self.state == self.OPEN:
+                self.set_state(self.HALF_OPEN, limit=1)
+        return healthy
+
+    def record_request(self, host: str, elapsed: float, failed: bool):
+        """
+        Count a finished request, called by the transport for every request.
+
+        Requests to other hosts, e.g. downloads of the input files, do not change the state.
+
+        Args:
+            host (str): The host and port of the request.
+            elapsed (float): Seconds the request took.
+            failed (bool): Whether the request failed or the server answered with an error.
+        """
+        if host != self.host:
+            return
+        failed = failed or elapsed > self.latency_threshold
+        with self._condition:
+            if self.state == self.OPEN:
+                # Requests sent before the circuit opened are still coming back
+                return
+            if failed:
+                self.failures += 1
+                if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                    self.set_state(self.OPEN, limit=0)
+                return
+
+            self.failures = 0
+            if self.state == self.HALF_OPEN:
+                self.successes += 1
+                if self.successes >= self.limit:
+                    if self.limit * 2 >= self.max_concurrency:
+                        self.set_state(self.CLOSED, limit=self.max_concurrency)
+                    else:
+                        self.set_state(self.HALF_OPEN, limit=self.limit * 2)
+
+    def set_state(self, state: str, limit: int):
+        """
+        Change the state of the circuit, must be called with the condition held.
+
+        Args:
+            state (str): The new state.
+            limit (int): The number of requests let through at the same time.
+        """
+        if state != self.state:
+            messages = {
+                self.OPEN: "Galaxy is degraded, pausing submissions and polling",
+                self.HALF_OPEN: "Galaxy answers again, resuming submissions and polling gradually",
+                self.CLOSED: "Galaxy is healthy, running at full speed"
+            }
+            print(messages[state])
+        if state == self.OPEN:
+            self.backoff.reset()
+            # An open circuit only closes again through the probes
+            self.start()
+        self.state = state
+        self.limit = limit
+        self.successes = 0
+        self._condition.notify_all()
+
+    def is_available(self) -> bool:
+        """
+        Return whether a gated request may be sent now, must be called with the condition held.
+
+        Returns:
+            bool: False while the circuit is open or the half-open limit is reached.
+        """
+        if self.state == self.CLOSED:
+            return True
+        return self.state == self.HALF_OPEN and self.in_flight < self.limit
+
+    def acquire(self):
+        """
+        Wait until a gated request may be sent.
+        """
+        with self._condition:
+            while not self.is_available():
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """
+        Mark a gated request as finished.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a slot for a gated request, waiting while the circuit is open.
+
+        Example:
+            >>> class Galaxy:
+            ...     url = "https://usegalaxy.eu/api"
+            >>> monitor = HealthMonitor(gi=Galaxy(), failure_threshold=2)
+            >>> with monitor.slot():
+            ...     monitor.in_flight
+            1
+            >>> for _ in range(2):
+            ...     monitor.record_request("usegalaxy.eu", 0.5, failed=True)
+            Galaxy is degraded, pausing submissions and polling
+            >>> monitor.state
+            'open'
+        """
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self, poll_interval: float = 1.0):
+        """
+        Hold a slot for a gated request of the async runner, without blocking the event loop.
+
+        Args:
+            poll_interval (float): Seconds between two checks while the circuit is open.
+        """
+        while True:
+            with self._condition:
+                if self.is_available():
+                    self.in_flight += 1
+                    break
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,171 @@
+import threading
+from bioblend import ConnectionError
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Dict,
+    List
+)
+
+
+class HistoryCleaner:
+    def __init__(self, gi, batch_size: int = 500, max_workers: int = 8):
+        """
+        Initialize the HistoryCleaner class.
+
+        History contents are purged with the bulk operation of the history contents API, a few requests
+        for the whole history. Servers without the bulk operation get one request per item, sent by
+        a bounded thread pool.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            batch_size (int): Number of items purged per bulk request.
+            max_workers (int): Maximum number of concurrent requests of the fallback.
+        """
+        self.gi = gi
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        # None until the first bulk request showed whether the server supports it
+        self.bulk_supported: bool | None = None
+        self.purge_threads: List[threading.Thread] = []
+
+    def list_contents(self, history_id: str) -> List[Dict]:
+        """
+        List the visible, not deleted items of a history.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+
+        Returns:
+            list: The items with ID, hid and content type.
+        """
+        return self.gi.histories.show_history(
+            history_id=history_id,
+            contents=True,
+            deleted=False,
+            visible=True,
+            keys=["id", "hid", "history_content_type"]
+        )
+
+    def clean(self, history_id: str, keep_ids: List[str]) -> List[str]:
+        """
+        Purge every item of a history except the given ones.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+            keep_ids (list): The IDs of the items to keep.
+
+        Returns:
+            list: The IDs of the kept items, in the order of keep_ids.
+        """
+        items = self.list_contents(history_id)
+        present = {item["id"] for item in items}
+        self.purge(history_id, [item for item in items if item["id"] not in keep_ids])
+        return [item_id for item_id in keep_ids if item_id in present]
+
+    def purge(self, history_id: str, items: List[Dict]):
+        """
+        Purge items of a history, in bulk if the server supports it.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+            items (list): The items with ID and content type.
+        """
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            if self.bulk_supported is not False and self.purge_bulk(history_id, batch):
+                continue
+            self.purge_each(history_id, batch)
+
+    def purge_bulk(self, history_id: str, items: List[Dict]) -> bool:
+        """
+        Purge items of a history with one bulk request.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+            items (list): The items with ID and content type.
+
+        Returns:
+            bool: False if the server does not support bulk operations.
+        """
+        payload = {
+            "operation": "purge",
+            "items": [{"id": item["id"], "history_content_type": item["history_content_type"]} for item in items]
+        }
+        try:
+            result = self.gi.make_put_request(f"{self.gi.url}/histories/{history_id}/contents/bulk", payload=payload)
+        except ConnectionError as e:
+            if self.bulk_supported is None and e.status_code in {400, 404, 405}:
+                print(f"Bulk history operations are not supported, purging one item at a time: {e}")
+                self.bulk_supported = False
+                return False
+            raise
+        self.bulk_supported = True
+        for error in result.get("errors", []):
+            print(f"Failed to purge {error.get('item', {}).get('id')}: {error.get('error')}")
+        return True
+
+    def purge_each(self, history_id: str, items: List[Dict]):
+        """
+        Purge items of a history with one request per item, several at a time.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+            items (list): The items with ID and content type.
+        """
+        def purge_item(item):
+            if item["history_content_type"] == "dataset":
+                self.gi.histories.delete_dataset(history_id=history_id, dataset_id=item["id"], purge=True)
+            else:
+                self.gi.histories.delete_dataset_collection(history_id=history_id, dataset_collection_id=item["id"])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for future in [executor.submit(purge_item, item) for item in items]:
+                future.result()
+
+    def replace_history(self, history_id: str, name: str, keep_ids: List[str]) -> Dict:
+        """
+        Create a new, empty history, copy the items to keep into it and purge the old history in the background.
+
+        Args:
+            history_id (str): The ID of the old history.
+            name (str): The name of the new history.
+            keep_ids (list): The IDs of the items copied into the new history.
+
+        Returns:
+            dict: The new history, with the IDs of the copies under 'kept_ids', in the order of keep_ids.
+        """
+        history = self.gi.histories.create_history(name)
+        items = {item["id"]: item for item in self.list_contents(history_id)}
+        kept_ids = []
+        for item_id in keep_ids:
+            if item_id in items:
+                source = "hda" if items[item_id]["history_content_type"] == "dataset" else "hdca"
+                copy = self.gi.histories.copy_content(history_id=history["id"], content_id=item_id, source=source)
+                kept_ids.append(copy["id"])
+
+        self.purge_history_async(history_id)
+        return history | {"kept_ids": kept_ids}
+
+    def purge_history_async(self, history_id: str) -> threading.Thread:
+        """
+        Purge a whole history without waiting for it.
+
+        The thread is not a daemon, so the program waits for the purge to finish before it exits.
+
+        Args:
+            history_id (str): The ID of the Galaxy history.
+
+        Returns:
+            threading.Thread: The thread sending the purge request.
+        """
+        def purge_history():
+            try:
+                self.gi.histories.delete_history(history_id=history_id, purge=True)
+                print(f"Purged history {history_id}")
+            except ConnectionError as e:
+                print(f"Failed to purge history {history_id}: {e}")
+
+        thread = threading.Thread(target=purge_history, name=f"purge-{history_id}")
+        thread.start()
+        self.purge_threads.append(thread)
+        return thread
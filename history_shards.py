@@ -0,0 +1,105 @@
+import threading
+from history_cleaner import HistoryCleaner
+from typing import (
+    Any,
+    Dict
+)
+
+
+class HistoryShards:
+    # Sources of the dataset references inside a tool input
+    DATASET_SOURCES = {"hda", "hdca"}
+
+    def __init__(self, gi, base_name: str, cleaner: HistoryCleaner):
+        """
+        Initialize the HistoryShards class.
+
+        Every probed tool gets a scratch history of its own, holding copies of the datasets its input
+        refers to, so listing, polling and cleaning up the jobs of one tool does not depend on the
+        number of jobs of all the others.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            base_name (str): The name of the main history, scratch histories are named after it.
+            cleaner (HistoryCleaner): The cleaner purging the scratch histories of earlier runs.
+        """
+        self.gi = gi
+        self.base_name = base_name
+        self.cleaner = cleaner
+        self.histories: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get_name(self, tool_name: str) -> str:
+        """
+        Return the name of the scratch history of a tool.
+
+        Args:
+            tool_name (str): The name of the tool.
+
+        Returns:
+            str: The history name.
+        Example:
+            >>> HistoryShards(gi=None, base_name="Metatranscriptomics", cleaner=None).get_name("HUMAnN")
+            'Metatranscriptomics - HUMAnN'
+        """
+        return f"{self.base_name} - {tool_name}"
+
+    def get_history(self, tool_name: str, reuse: bool = False) -> str:
+        """
+        Return the scratch history of a tool, creating it on first use in this run.
+
+        Scratch histories left by an earlier run are purged in the background, unless they are reused,
+        e.g. by a resumed run whose jobs still run in them.
+
+        Args:
+            tool_name (str): The name of the tool.
+            reuse (bool): Whether an existing scratch history of the tool is used instead of a new one.
+
+        Returns:
+            str: The ID of the scratch history.
+        """
+        with self._lock:
+            if tool_name in self.histories:
+                return self.histories[tool_name]
+
+        name = self.get_name(tool_name)
+        existing = self.gi.histories.get_histories(name=name)
+        if reuse and existing:
+            history_id = existing[0]["id"]
+        else:
+            for history in existing:
+                self.cleaner.purge_history_async(history["id"])
+            history_id = self.gi.histories.create_history(name)["id"]
+
+        with self._lock:
+            return self.histories.setdefault(tool_name, history_id)
+
+    def copy_inputs(self, history_id: str, tool_input: Any) -> Any:
+        """
+        Copy every dataset a tool input refers to into a history and point the input to the copies.
+
+        Args:
+            history_id (str): The ID of the target history.
+            tool_input (dict or list): The tool input.
+
+        Returns:
+            dict or list: A copy of the tool input referring to the copied datasets.
+        """
+        copies: Dict[tuple, str] = {}
+
+        def replace(node):
+            if isinstance(node, dict):
+                if node.get("src") in self.DATASET_SOURCES and "id" in node:
+                    key = (node["src"], node["id"])
+                    if key not in copies:
+                        copy = self.gi.histories.copy_content(
+                            history_id=history_id, content_id=node["id"], source=node["src"]
+                        )
+                        copies[key] = copy["id"]
+                    return node | {"id": copies[key]}
+                return {key: replace(value) for key, value in node.items()}
+            if isinstance(node, list):
+                return [replace(item) for item in node]
+            return node
+
+        return replace(tool_input)
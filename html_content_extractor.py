@@ -1,56 +1,60 @@
-from bs4 import BeautifulSoup
+from tool_source_cache import ToolSourceCache
 import requests
 
 
 class HTMLContentExtractor:
-    def __init__(self):
+    def __init__(self, cache: ToolSourceCache | None = None, session=None):
         """
         Initialize the HTMLContentExtractor class.
 
+        Args:
+            cache (ToolSourceCache | None): Persistent tool source cache, None to always download.
+            session: Session or HttpTransport sending the downloads, None for plain requests.
         """
         self.html_content = None
+        self.cache = cache
+        self.session = session or requests
 
-    def capture_html_content(self, url):
+    def capture_html_content(self, url, tool_id: str | None = None, version: str | None = None):
         """
         Capture HTML content from the specified URL.
 
+        If a tool source cache is set and the tool ID is given, the content is served from the cache.
+
         Parameters:
         - url (str): The URL from which to capture HTML content.
+        - tool_id (str | None, optional): The ID of the tool the URL belongs to. Defaults to None.
+        - version (str | None, optional): The version of the tool. Defaults to None.
 
         Raises:
         - requests.exceptions.RequestException: If there is an error while making the request.
         """
 
         try:
+            if self.cache is not None and tool_id is not None:
+                self.html_content = self.cache.fetch(url=url, tool_id=tool_id, version=version)
+                return
+
             # Make a GET request to the specified URL
-            response = requests.get(url=url)
+            response = self.session.get(url)
 
             # Check if the request was successful (status code 200)
             response.raise_for_status()
 
-            # Assign the HTML content to the instance variable
-            self.html_content = response.text
+            # Assign the raw content to the instance variable, it is parsed from bytes later on
+            self.html_content = response.content
         except requests.exceptions.RequestException as e:
             # Handle any request-related exceptions
             print(f'Error making request: {e}')
 
-    def extract_and_prettify_xml(self, class_name='language-xml'):
+    def extract_xml_content(self):
         """
-        Extract XML content with a specific class from captured HTML and prettify it.
-
-        Args:
-            class_name (str): The class name of the HTML element containing XML content.
+        Return the captured tool XML as raw bytes, ready to be parsed without any reformatting.
 
         Returns:
-            str: Prettified XML content.
+            bytes: The XML content.
         """
         if self.html_content:
-            soup = BeautifulSoup(self.html_content, 'xml')
-            if soup:
-                xml_code = soup.prettify()
-
-                return xml_code
-            else:
-                print(f'No element with class "{class_name}" found.')
+            return self.html_content
         else:
             print('HTML content not captured. Run capture_html_content() first.')
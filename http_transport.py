@@ -0,0 +1,334 @@
+import json
+import threading
+import time
+import requests
+from bioblend import ConnectionError
+from bioblend.galaxy import GalaxyInstance
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.poolmanager import pool_classes_by_scheme
+from urllib3.util.retry import Retry
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List
+)
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    def __init__(self, on_connect: Callable[[str], None], **kwargs: Any):
+        """
+        Initialize the CountingHTTPAdapter class.
+
+        An HTTPAdapter whose pools report every connection they open, so the reuse of the pooled
+        connections can be measured.
+
+        Args:
+            on_connect (Callable[[str], None]): Called with the host and port of every new connection.
+            **kwargs: Arguments of HTTPAdapter.
+        """
+        self.on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any):
+        """
+        Create the pool manager with pools whose connections report their creation.
+        """
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: self.counting_pool(pool_class) for scheme, pool_class in pool_classes_by_scheme.items()
+        }
+
+    def counting_pool(self, pool_class: type) -> type:
+        """
+        Derive a connection pool class whose connections call on_connect when they are created.
+
+        Args:
+            pool_class (type): The urllib3 connection pool class.
+
+        Returns:
+            type: The derived pool class.
+        """
+        on_connect = self.on_connect
+
+        class CountingConnection(pool_class.ConnectionCls):
+            def __init__(self, host: str, port: int | None = None, *args: Any, **kwargs: Any):
+                super().__init__(host, port, *args, **kwargs)
+                on_connect(host if port in (None, 80, 443) else f"{host}:{port}")
+
+        return type(pool_class.__name__, (pool_class,), {"ConnectionCls": CountingConnection})
+
+
+class HttpTransport:
+    # Methods which are safe to send again after a connection error or a temporary server error
+    RETRY_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        post_timeout: float | None = None
+    ):
+        """
+        Initialize the HttpTransport class.
+
+        All requests go through one session whose keep-alive connections are reused, so talking to the
+        same host again does not open a new TLS connection. Idempotent requests are retried with an
+        exponential backoff after connection errors and gateway errors.
+
+        Args:
+            pool_size (int): Maximum number of kept connections per host, should match the number of threads.
+            timeout (float): Seconds to wait for the server if an idempotent request does not set its own timeout.
+            retries (int): Number of retries of a failed idempotent request.
+            backoff_factor (float): Base of the delay between retries, doubled every retry.
+            post_timeout (float | None): Seconds to wait for a POST or PATCH request without a timeout of its
+                own, None to wait as long as it takes. Galaxy may still create a job after the client gave
+                up on its submission, which would then be submitted again by a resumed run.
+        """
+        self.timeout = timeout
+        self.post_timeout = post_timeout
+        self.host_metrics: Dict[str, Dict[str, float]] = {}
+        self.connections: Dict[str, int] = {}
+        # Called with the host, the duration and the outcome of every request, e.g. by the health monitor
+        self.observers: List[Callable[[str, float, bool], None]] = []
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=self.RETRY_METHODS,
+            raise_on_status=False
+        )
+        self.adapter = CountingHTTPAdapter(
+            on_connect=self.count_connection, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Send a request over the pooled session and record it in the metrics of its host.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            **kwargs: Arguments of requests.request.
+
+        Returns:
+            requests.Response: The response.
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed after all retries.
+        """
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout if method.upper() in self.RETRY_METHODS else self.post_timeout
+        host = urlsplit(url).netloc
+        start = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record(host, time.monotonic() - start, failed=True)
+            raise
+        self.record(host, time.monotonic() - start, failed=response.status_code >= 500)
+        return response
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Send a GET request, the transport can stand in for a requests session.
+
+        Args:
+            url (str): The URL.
+            **kwargs: Arguments of requests.get.
+
+        Returns:
+            requests.Response: The response.
+        """
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Send a HEAD request.
+
+        Args:
+            url (str): The URL.
+            **kwargs: Arguments of requests.head.
+
+        Returns:
+            requests.Response: The response.
+        """
+        return self.request("HEAD", url, **kwargs)
+
+    def record(self, host: str, elapsed: float, failed: bool):
+        """
+        Add a request to the metrics of a host.
+
+        Args:
+            host (str): The host and port of the request.
+            elapsed (float): Seconds the request took, including retries.
+            failed (bool): Whether the request failed or the server answered with an error.
+        """
+        with self._lock:
+            metrics = self.host_metrics.setdefault(host, {"requests": 0, "failures": 0, "seconds": 0.0})
+            metrics["requests"] += 1
+            metrics["failures"] += int(failed)
+            metrics["seconds"] += elapsed
+        for observer in self.observers:
+            observer(host, elapsed, failed)
+
+    def count_connection(self, host: str):
+        """
+        Count a connection opened by the pool.
+
+        Args:
+            host (str): The host and port of the connection.
+        """
+        with self._lock:
+            self.connections[host] = self.connections.get(host, 0) + 1
+
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return the request and connection counts of every host.
+
+        Returns:
+            dict: Per host the number of requests, failed requests, seconds spent in requests and
+            connections opened, the difference between requests and connections is the reuse.
+        Example:
+            >>> transport = HttpTransport()
+            >>> transport.record("usegalaxy.eu", 0.5, failed=False)
+            >>> transport.record("usegalaxy.eu", 1.5, failed=True)
+            >>> transport.get_metrics()
+            {'usegalaxy.eu': {'requests': 2, 'failures': 1, 'seconds': 2.0, 'connections': 0}}
+        """
+        with self._lock:
+            return {
+                host: dict(metrics, connections=self.connections.get(host, 0))
+                for host, metrics in self.host_metrics.items()
+            }
+
+    def print_metrics(self):
+        """
+        Print the metrics of every host.
+        """
+        for host, metrics in self.get_metrics().items():
+            average = metrics["seconds"] / metrics["requests"] if metrics["requests"] else 0.0
+            print(
+                f"{host}: {metrics['requests']} requests over {metrics['connections']} connections, "
+                f"{metrics['failures']} failed, {average:.2f} s on average"
+            )
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self.session.close()
+
+
+class PooledGalaxyInstance(GalaxyInstance):
+    def __init__(self, url: str, key: str, transport: HttpTransport, **kwargs: Any):
+        """
+        Initialize the PooledGalaxyInstance class.
+
+        A GalaxyInstance whose API requests are sent over a shared HttpTransport instead of a new
+        connection per request.
+
+        Args:
+            url (str): The URL of the Galaxy server.
+            key (str): The API key.
+            transport (HttpTransport): The transport shared with the other clients.
+            **kwargs: Further arguments of GalaxyInstance.
+        """
+        super().__init__(url=url, key=key, **kwargs)
+        self.transport = transport
+
+    def make_get_request(self, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Send a GET request to the Galaxy API over the shared transport.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("verify", self.verify)
+        return self.transport.request("GET", url, headers=self.json_headers, **kwargs)
+
+    def make_post_request(
+        self, url: str, payload: dict | None = None, params: dict | None = None, files_attached: bool = False
+    ) -> Any:
+        """
+        Send a POST request to the Galaxy API, multipart uploads are sent by bioblend.
+        """
+        if files_attached:
+            # Multipart uploads keep the streaming encoder of bioblend
+            return super().make_post_request(url, payload=payload, params=params, files_attached=True)
+        return self.send_json("POST", url, payload, params)
+
+    def make_put_request(self, url: str, payload: dict | None = None, params: dict | None = None) -> Any:
+        """
+        Send a PUT request to the Galaxy API over the shared transport.
+        """
+        return self.send_json("PUT", url, payload, params)
+
+    def make_patch_request(self, url: str, payload: dict | None = None, params: dict | None = None) -> Any:
+        """
+        Send a PATCH request to the Galaxy API over the shared transport.
+        """
+        return self.send_json("PATCH", url, payload, params)
+
+    def make_delete_request(self, url: str, payload: dict | None = None, params: dict | None = None) -> requests.Response:
+        """
+        Send a DELETE request to the Galaxy API over the shared transport.
+        """
+        return self.transport.request(
+            "DELETE",
+            url,
+            params=params,
+            data=json.dumps(payload) if payload is not None else None,
+            headers=self.json_headers,
+            timeout=self.timeout,
+            allow_redirects=False,
+            verify=self.verify
+        )
+
+    def send_json(self, method: str, url: str, payload: dict | None, params: dict | None) -> Any:
+        """
+        Send a JSON payload and decode the JSON response, like the bioblend request methods.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            payload (dict | None): The JSON payload.
+            params (dict | None): The query parameters.
+
+        Returns:
+            Any: The decoded response.
+
+        Raises:
+            ConnectionError: If the server does not answer with status 200 and valid JSON.
+        """
+        response = self.transport.request(
+            method,
+            url,
+            params=params,
+            data=json.dumps(payload) if payload is not None else None,
+            headers=self.json_headers,
+            timeout=self.timeout,
+            allow_redirects=False,
+            verify=self.verify
+        )
+        if response.status_code == 200:
+            try:
+                return response.json()
+            except Exception as e:
+                raise ConnectionError(
+                    f"Request was successful, but cannot decode the response content: {e}",
+                    body=response.content,
+                    status_code=response.status_code
+                )
+        raise ConnectionError(
+            f"Unexpected HTTP status code: {response.status_code}",
+            body=response.text,
+            status_code=response.status_code
+        )
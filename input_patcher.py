@@ -0,0 +1,121 @@
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple
+)
+
+
+class InputPatcher:
+    def __init__(self, template: Any):
+        """
+        Initialize the InputPatcher class.
+
+        The template is walked once and the path of every key is recorded, so patching a key later
+        does not need to search the tree again. The template must not be changed afterwards.
+
+        Args:
+            template (dict or list): The nested tool input used as template.
+        """
+        self.template = template
+        self.paths: Dict[str, List[Tuple]] = {}
+        self.compile(template, ())
+
+    def compile(self, node: Any, path: Tuple):
+        """
+        Record the path of every dictionary key below a node.
+
+        Paths of a key are recorded depth first, nested occurrences before the enclosing one, so a
+        key nested in another occurrence of itself is patched before the enclosing value replaces it.
+
+        Args:
+            node (dict or list): The current node of the template.
+            path (tuple): The keys and list indices leading to the node.
+        """
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, (dict, list)):
+                    self.compile(value, path + (key,))
+                self.paths.setdefault(key, []).append(path + (key,))
+        elif isinstance(node, list):
+            for index, item in enumerate(node):
+                self.compile(item, path + (index,))
+
+    def apply(self, values: Dict[str, Any]) -> Any:
+        """
+        Return a copy of the template in which every occurrence of the given keys has a new value.
+
+        Only the containers along the changed paths are copied, everything else is shared with the
+        template, so the result must be treated as read-only. Keys are applied in the given order and
+        only along the paths recorded in the template: a later key is still patched where such a path
+        exists inside the value of an earlier key, and skipped where the earlier value does not hold it.
+
+        Args:
+            values (dict): The new value of every key to patch.
+
+        Returns:
+            dict or list: The patched tree.
+        Example:
+            >>> template = {'a': 1, 'b': {'c': 2, 'd': {'e': 3}}, 'f': [{'e': 4}]}
+            >>> patcher = InputPatcher(template)
+            >>> patched = patcher.apply({'e': 5})
+            >>> patched
+            {'a': 1, 'b': {'c': 2, 'd': {'e': 5}}, 'f': [{'e': 5}]}
+            >>> template['b']['d'], patched['b'] is template['b']
+            ({'e': 3}, False)
+        """
+        result = self.copy_container(self.template)
+        copied = {()}
+
+        for key, value in values.items():
+            for path in self.paths.get(key, []):
+                node = result
+                for depth, step in enumerate(path[:-1]):
+                    child = node[step] if self.has_step(node, step) else None
+                    if not isinstance(child, (dict, list)):
+                        # An earlier patch replaced the subtree holding this path
+                        break
+                    if path[:depth + 1] not in copied:
+                        child = self.copy_container(child)
+                        node[step] = child
+                        copied.add(path[:depth + 1])
+                    node = child
+                else:
+                    if isinstance(node, dict) and path[-1] in node:
+                        node[path[-1]] = value
+                        if path in copied:
+                            # The copied subtree is gone, the new value must be copied before it is patched
+                            copied = {prefix for prefix in copied if prefix[:len(path)] != path}
+
+        return result
+
+    def has_step(self, node: Any, step: Any) -> bool:
+        """
+        Check whether a container still has the given key or index.
+
+        Args:
+            node (dict or list): The container.
+            step (str or int): The key or index.
+
+        Returns:
+            bool: True if the step exists in the container.
+        """
+        if isinstance(node, dict):
+            return step in node
+        return isinstance(step, int) and step < len(node)
+
+    def copy_container(self, node: Any) -> Any:
+        """
+        Make a shallow copy of a dictionary or list.
+
+        Args:
+            node (dict or list): The container to copy.
+
+        Returns:
+            dict or list: The copy, other values are returned unchanged.
+        """
+        if isinstance(node, dict):
+            return dict(node)
+        if isinstance(node, list):
+            return list(node)
+        return node
@@ -0,0 +1,247 @@
+from bioblend import ConnectionError
+from datetime import datetime, timedelta, timezone
+from poll_scheduler import Backoff, PollScheduler
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Tuple
+)
+
+
+class JobSetWatcher:
+    # Job states after which a Galaxy job will not change anymore
+    TERMINAL_STATES = ["ok", "error", "failed", "paused", "skipped", "deleted", "deleted_new", "stopped"]
+
+    def __init__(
+        self,
+        gi,
+        history_id: str,
+        page_size: int = 500,
+        initial_interval: float = 2.0,
+        max_interval: float = 60.0,
+        deadline: float | None = None,
+        health=None
+    ):
+        """
+        Initialize the JobSetWatcher class.
+
+        The watcher settles a whole set of jobs of one history with the bulk jobs listing,
+        filtered by history and terminal state, instead of asking for every job on its own.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            history_id (str): The ID of the Galaxy history the jobs run in.
+            page_size (int): Number of jobs requested per listing page.
+            initial_interval (float): Delay in seconds between the first rounds.
+            max_interval (float): Upper bound in seconds for the delay between two rounds.
+            deadline (float | None): Time in seconds after which unfinished jobs are given up, None for no limit.
+            health (HealthMonitor | None): Circuit breaker the rounds wait for while the server is degraded.
+        """
+        self.gi = gi
+        self.history_id = history_id
+        self.page_size = page_size
+        self.backoff = Backoff(initial=initial_interval, maximum=max_interval)
+        self.deadline = time.monotonic() + deadline if deadline is not None else None
+        self.health = health
+
+        # Jobs which are updated before the watcher was created cannot belong to it
+        self.since = self.get_since(time.time())
+
+        self.pending: Dict[str, Any] = {}
+        self.closed = False
+        self._lock = threading.Lock()
+        self._added = threading.Event()
+
+    def get_since(self, timestamp: float) -> str:
+        """
+        Return the update time from which on jobs created at a given time are listed.
+
+        Args:
+            timestamp (float): The creation time of the jobs, as returned by time.time().
+
+        Returns:
+            str: The time in the ISO format of the jobs listing, with some clock skew allowed.
+        """
+        return (datetime.fromtimestamp(timestamp, timezone.utc) - timedelta(minutes=5)).replace(tzinfo=None).isoformat()
+
+    def add(self, job_id: str, payload: Any = None, submitted_at: float | None = None):
+        """
+        Add a job to the set of watched jobs.
+
+        Args:
+            job_id (str): The ID of the Galaxy job.
+            payload (Any): Data handed back together with the final state of the job.
+            submitted_at (float | None): The submission time of a job created before the watcher,
+                e.g. by an interrupted run, so the listing goes back far enough to find it.
+        """
+        with self._lock:
+            self.pending[job_id] = payload
+            if submitted_at is not None:
+                self.since = min(self.since, self.get_since(submitted_at))
+        self._added.set()
+
+    def close(self):
+        """
+        Signal that no more jobs will be added, watch() stops once all pending jobs are settled.
+        """
+        self.closed = True
+        self._added.set()
+
+    def fetch_terminal_jobs(self) -> List[Dict]:
+        """
+        List the jobs of the history which reached a terminal state since the watcher was created.
+
+        Pages are requested most recently updated first and only until every pending job was seen
+        or the listing reaches jobs older than the watcher.
+
+        Returns:
+            list: Job summaries ordered from the least to the most recently updated.
+        """
+        pending = self.get_pending()
+        jobs = []
+        offset = 0
+        while pending:
+            page = self.gi.jobs.get_jobs(**self.build_params(offset))
+            if not self.collect_page(page, pending, jobs):
+                break
+            offset += self.page_size
+
+        return sorted(jobs, key=lambda job: job.get("update_time", ""))
+
+    def get_pending(self) -> set:
+        """
+        Return the IDs of the pending jobs.
+
+        Returns:
+            set: A copy of the IDs, which is not changed by jobs added later.
+        """
+        with self._lock:
+            return set(self.pending)
+
+    def build_params(self, offset: int) -> Dict[str, Any]:
+        """
+        Return the parameters of a page of the jobs listing.
+
+        Args:
+            offset (int): The number of jobs on the pages before.
+
+        Returns:
+            dict: The parameters of the jobs listing, a list value repeats its parameter.
+        Example:
+            >>> watcher = JobSetWatcher(gi=None, history_id="f2db41e1fa331b3e", page_size=100)
+            >>> watcher.since = "2024-05-01T10:00:00"
+            >>> params = watcher.build_params(offset=200)
+            >>> params["date_range_min"], params["limit"], params["offset"]
+            ('2024-05-01', 100, 200)
+        """
+        return {
+            "state": self.TERMINAL_STATES,
+            "history_id": self.history_id,
+            "date_range_min": self.since[:10],
+            "limit": self.page_size,
+            "offset": offset,
+            "order_by": "update_time"
+        }
+
+    def collect_page(self, page: List[Dict], pending: set, jobs: List[Dict]) -> bool:
+        """
+        Move the pending jobs of a listing page from the pending set to the finished jobs.
+
+        Args:
+            page (list): The job summaries of the page.
+            pending (set): The IDs of the jobs not seen yet.
+            jobs (list): The finished jobs seen so far.
+
+        Returns:
+            bool: Whether the next page may hold more of the pending jobs.
+        """
+        for job in page:
+            if job["id"] in pending:
+                pending.discard(job["id"])
+                jobs.append(job)
+        return len(page) == self.page_size and page[-1].get("update_time", "") >= self.since
+
+    def watch(self) -> Iterator[Tuple[str, str, Any]]:
+        """
+        Yield every watched job as soon as it reached a terminal state.
+
+        Jobs are yielded in the order in which they finished, so a slow job does not hold back the
+        report of the ones that finished after it. The loop ends when close() was called and no job
+        is pending anymore.
+
+        Yields:
+            tuple: The job ID, the final state and the payload given to add().
+        """
+        while True:
+            with self._lock:
+                if not self.pending and self.closed:
+                    return
+                idle = not self.pending
+                if idle:
+                    self._added.clear()
+            if idle:
+                # Nothing to watch until the next job is added or the watcher is closed
+                self._added.wait()
+                continue
+
+            expired = self.expire()
+            if expired:
+                yield from expired
+                continue
+
+            try:
+                if self.health is None:
+                    finished = self.fetch_terminal_jobs()
+                else:
+                    with self.health.slot():
+                        finished = self.fetch_terminal_jobs()
+            except ConnectionError as e:
+                print(f"Failed to connect to Galaxy while watching jobs: {e}")
+                finished = []
+
+            yield from self.settle(finished)
+            if self.pending:
+                time.sleep(self.backoff.next_delay())
+
+    def expire(self) -> List[Tuple[str, str, Any]]:
+        """
+        Give up all pending jobs once the deadline passed.
+
+        Returns:
+            list: The job ID, the deadline_exceeded state and the payload of every given up job,
+            empty before the deadline.
+        """
+        if self.deadline is None or time.monotonic() < self.deadline:
+            return []
+        with self._lock:
+            expired, self.pending = self.pending, {}
+        return [(job_id, PollScheduler.DEADLINE_EXCEEDED, payload) for job_id, payload in expired.items()]
+
+    def settle(self, finished: List[Dict]) -> List[Tuple[str, str, Any]]:
+        """
+        Remove the finished jobs of a round from the pending jobs.
+
+        Args:
+            finished (list): The job summaries returned by the jobs listing.
+
+        Returns:
+            list: The job ID, the final state and the payload of every finished job.
+        Example:
+            >>> watcher = JobSetWatcher(gi=None, history_id="f2db41e1fa331b3e")
+            >>> watcher.add("job1", payload={"db": "hg38"})
+            >>> watcher.add("job2")
+            >>> watcher.settle([{"id": "job1", "state": "ok"}])
+            [('job1', 'ok', {'db': 'hg38'})]
+            >>> list(watcher.pending)
+            ['job2']
+        """
+        with self._lock:
+            settled = [(job["id"], job["state"], self.pending.pop(job["id"])) for job in finished]
+        if settled:
+            # Jobs are finishing, keep the interval short
+            self.backoff.reset()
+        return settled
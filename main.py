@@ -1,16 +1,20 @@
 from galaxytools_workflow import *
-import multiprocessing
+import asyncio
+import sys
 import yaml
+from async_runner import AsyncGalaxyClient, AsyncWorkflowRunner
 from file_downloader import FileDownloader
-import sys
+from fastq_subsampler import FastqSubsampler
+import argparse
 
 
 class Initialize:
-    def __init__(self, server, api_key, history_name):
+    def __init__(self, server, api_key, history_name, fresh_history=False, **workflow_options):
         self.server = server
         self.api_key = api_key
         self.history_name = history_name
-        self.gi = GalaxyWorkflow(server, api_key)
+        self.fresh_history = fresh_history
+        self.gi = GalaxyWorkflow(server, api_key, **workflow_options)
         self.tools = []
         self.input_ids = []
 
@@ -18,13 +22,13 @@ class Initialize:
         self.gi.get_history_id(history_name=self.history_name)
 
     def upload_files(self, file_forward, file_reverse):
-        self.input_ids.append(self.gi.upload_file(file_forward, "T1A_forward"))
-        self.input_ids.append(self.gi.upload_file(file_reverse, "T1A_reverse"))
+        self.input_ids = self.gi.upload_files([(file_forward, "T1A_forward"), (file_reverse, "T1A_reverse")])
 
     def define_tools(self, file_forward, file_reverse, file_workflow):
+        # Inputs already in the history are found by their content, so changed inputs, e.g. subsampled ones, are uploaded.
+        # The cleanup afterwards keeps exactly these datasets, stale inputs are purged with the rest
+        self.upload_files(file_forward, file_reverse)
         self.delete_dataset()
-        if not self.input_ids:
-            self.upload_files(file_forward, file_reverse)
         forward_id, reverse_id = self.input_ids
         workflow_ids = self.gi.workflow_input(forward_id=forward_id, reverse_id=reverse_id)
         self.gi.run_workflow(workflow_inputs=workflow_ids, file_workflow=file_workflow)
@@ -49,8 +53,59 @@ class Initialize:
         # Check the state of the workflow
         self.gi.check_state_workflow(workflow_invocation_info)
 
+    async def run_async(self, file_forward, file_reverse, file_workflow, resume=False):
+        """
+        Run the workflow and probe its tools with the asyncio runner.
+
+        The uploads and the workflow invocation are a few sequential steps and run on a worker thread,
+        large inputs keep going through the tus client of bioblend. The polling, tool source downloads,
+        submissions and job watching of the probing then run as tasks on the event loop.
+
+        Args:
+            file_forward (str): The forward reads.
+            file_reverse (str): The reverse reads.
+            file_workflow (str): The workflow file.
+            resume (bool): Whether to continue the interrupted run of the history.
+
+        Returns:
+            None
+        """
+        async with AsyncGalaxyClient(
+            url=self.gi.gi.url,
+            api_key=self.api_key,
+            timeout=self.gi.transport.timeout,
+            post_timeout=self.gi.transport.post_timeout,
+            metrics=self.gi.transport
+        ) as client:
+            runner = AsyncWorkflowRunner(workflow=self.gi, client=client)
+            dataset_ids = self.gi.get_resume_datasets() if resume else None
+            if dataset_ids is None:
+                await asyncio.to_thread(self.define_tools, file_forward, file_reverse, file_workflow)
+                dataset_ids = await asyncio.to_thread(self.gi.workflow_show_invocation)
+            else:
+                pprint(f"Resuming with {len(dataset_ids)} tracked datasets")
+            await runner.run(dataset_ids)
+
+    def resume(self) -> bool:
+        """
+        Continue the interrupted run of the history, without purging it or running the workflow again.
+
+        Returns:
+            bool: False if there is no run to resume.
+        """
+        dataset_ids = self.gi.get_resume_datasets()
+        if dataset_ids is None:
+            return False
+        pprint(f"Resuming with {len(dataset_ids)} tracked datasets")
+        self.gi.check_state_workflow(dataset_ids)
+        return True
+
     def delete_dataset(self):
-        self.input_ids = self.gi.delete_dataset_and_datacollection()
+        if self.fresh_history:
+            # The old history is purged in the background
+            self.input_ids = self.gi.start_fresh_history(history_name=self.history_name, keep_ids=self.input_ids)
+        else:
+            self.input_ids = self.gi.delete_dataset_and_datacollection(keep_ids=self.input_ids)
 
 
 def load_config(file_path='config.yml'):
@@ -59,58 +114,170 @@ def load_config(file_path='config.yml'):
     return config
 
 
-def initialize_workflow(config):
-    file_downloader = FileDownloader()
-    file_path = []
-
-    # Download and rename files
-    for file_info in config["files"]:
-        url = file_info["url"]
-        destination_folder = file_info["destination_folder"]
-        rename_to = file_info["rename_to"]
+def initialize_workflow(config, transport=None):
+    file_downloader = FileDownloader(session=transport)
 
-        downloaded_file_path = file_downloader.download_file(url, destination_folder)
-        file_path.append(file_downloader.rename_file(downloaded_file_path, rename_to))
+    # Download the files and the workflow file at once, files present from an earlier run are kept
+    return file_downloader.download_files(config["files"] + [config["workflow"]])
 
-    # Download workflow file
-    workflow_url = config["workflow"]["url"]
-    workflow_destination_folder = config["workflow"]["destination_folder"]
-    file_path.append(file_downloader.download_file(workflow_url, workflow_destination_folder))
-    return file_path
 
-
-def main(server, api_key):
+def main(server, api_key, args):
     config = load_config()
-    file_forward, file_reverse, file_workflow = initialize_workflow(config=config)
+    # One pool of keep-alive connections for the downloads, the Galaxy API and the health check
+    transport = HttpTransport(
+        pool_size=config.get('http_pool_size', 16),
+        timeout=config.get('http_timeout', 60),
+        retries=config.get('http_retries', 3),
+        post_timeout=config.get('http_post_timeout')
+    )
+    file_forward, file_reverse, file_workflow = initialize_workflow(config=config, transport=transport)
     file_forward = "Upload_files/newfile_T1A_forward"
     file_reverse = "Upload_files/newfile_T1A_reverse"
+    if args.subsample and not args.dry_run:
+        # Probing a combination only needs a few reads, not the whole sample
+        subsampler = FastqSubsampler(
+            read_count=args.subsample,
+            method=args.subsample_method,
+            seed=args.seed if args.seed is not None else 0
+        )
+        file_forward, file_reverse = subsampler.subsample_pair(
+            forward_path=file_forward, reverse_path=file_reverse, output_dir="Upload_files/subsampled"
+        )
 
     history_name = config['history_name']
-    workflow = Initialize(server=server, api_key=api_key, history_name=history_name)
+    workflow = Initialize(
+        server=server,
+        api_key=api_key,
+        history_name=history_name,
+        fresh_history=args.fresh_history,
+        tool_cache_dir=config.get('tool_cache_dir'),
+        max_combinations=args.max_combinations,
+        dry_run=args.dry_run,
+        sampler=CombinationSampler(
+            strategy=args.sampling,
+            strength=args.strength,
+            sample_size=args.sample_size,
+            seed=args.seed
+        ),
+        results_db=args.results_db,
+        checkpoint_file=config.get('checkpoint_file'),
+        resume=args.resume,
+        change_state_file=config.get('change_state_file') if args.incremental else None,
+        upload_chunk_size=config.get('upload_chunk_size_mb', 10) * 1024 * 1024,
+        chunked_upload_threshold=config.get('chunked_upload_threshold_mb', 100) * 1024 * 1024,
+        upload_state_dir=config.get('upload_state_dir'),
+        shard_histories=args.shard_histories,
+        transport=transport,
+        health_interval=config.get('health_check_interval', 60),
+        health_latency_threshold=config.get('health_latency_threshold', 20)
+    )
+    if args.dry_run:
+        # The tools are read from the workflow file, the history is left untouched
+        try:
+            workflow.gi.count_workflow_combinations(file_workflow=file_workflow)
+        finally:
+            workflow.gi.save_caches()
+            transport.print_metrics()
+        return
+
+    # Probes Galaxy in the background, submissions and polling pause while it is degraded
+    workflow.gi.health.start()
     workflow.get_history()
 
-    workflow.define_tools(file_forward=file_forward, file_reverse=file_reverse, file_workflow=file_workflow)
-    workflow.show_invocation()
+    try:
+        if args.use_async:
+            asyncio.run(workflow.run_async(file_forward, file_reverse, file_workflow, resume=args.resume))
+            return
+        if args.resume and workflow.resume():
+            return
+        workflow.define_tools(file_forward=file_forward, file_reverse=file_reverse, file_workflow=file_workflow)
+        workflow.show_invocation()
+    finally:
+        workflow.gi.save_caches()
+        transport.print_metrics()
 
 
-def check_connection(server: str, api_key: str):
-    gi = GalaxyWorkflow(server, api_key)
-    while True:
-        time.sleep(60)
-        gi.connect_to_galaxy_with_retry()
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Detect incompatibilities between installed Galaxy tools")
+    parser.add_argument('--key', required=True, help="Galaxy API key")
+    parser.add_argument(
+        '--max-combinations',
+        type=int,
+        default=None,
+        help="Submit at most this many combinations per tool"
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help="Only count the combinations of every tool of the workflow file, without cleaning the history, "
+             "uploading, invoking the workflow or submitting jobs"
+    )
+    parser.add_argument(
+        '--sampling',
+        choices=CombinationSampler.STRATEGIES,
+        default='exhaustive',
+        help="Run every combination, a pairwise or t-wise covering array, or a random sample"
+    )
+    parser.add_argument('--strength', type=int, default=2, help="Number of params covered together by t-wise sampling")
+    parser.add_argument('--sample-size', type=int, default=None, help="Number of combinations drawn by random sampling")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the random sampling")
+    parser.add_argument(
+        '--results-db',
+        default=None,
+        help="SQLite file recording every run, combination and job, e.g. results.sqlite"
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help="Continue the interrupted run from the checkpoint file instead of purging the history"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="Only run tools and combinations which changed since the last sweep"
+    )
+    parser.add_argument(
+        '--subsample',
+        type=int,
+        default=None,
+        help="Upload only this many read pairs of the input files"
+    )
+    parser.add_argument(
+        '--subsample-method',
+        choices=FastqSubsampler.METHODS,
+        default='first',
+        help="Keep the first read pairs or a random sample of all read pairs, seeded with --seed"
+    )
+    parser.add_argument(
+        '--fresh-history',
+        action='store_true',
+        help="Run in a new history and purge the old one in the background instead of cleaning it"
+    )
+    parser.add_argument(
+        '--shard-histories',
+        action='store_true',
+        help="Run the combinations of every tool in a scratch history of its own"
+    )
+    parser.add_argument(
+        '--async',
+        dest='use_async',
+        action='store_true',
+        help="Probe the tools with the asyncio runner instead of thread pools, needs aiohttp and Python 3.11"
+    )
+    args = parser.parse_args(argv)
+    if args.sampling == 'random' and (args.sample_size or 0) < 1:
+        # Checked here so the run does not fail after the downloads and the workflow
+        parser.error("--sampling random needs a positive --sample-size")
+    if args.use_async and sys.version_info < (3, 11):
+        # The runner groups its tasks with asyncio.TaskGroup
+        parser.error("--async needs Python 3.11 or newer")
+    return args
 
 
 if __name__ == '__main__':
-    # Check if the API key is provided as a command-line argument
-    if len(sys.argv) < 3 or sys.argv[1] != '--key':
-        print("Error: API key not provided. Use python3 main.py --key {your_key}")
-        sys.exit(1)
+    # The API key is required as a command-line argument
+    args = parse_arguments()
 
-    api_key = sys.argv[2]
+    api_key = args.key
     server = 'https://usegalaxy.eu/'
-    process1 = multiprocessing.Process(target=main, args=[server, api_key])
-    process2 = multiprocessing.Process(target=check_connection, args=[server, api_key])
-    process1.start()
-    process2.start()
-    process1.join()
-    process2.terminate()
+    main(server, api_key, args)
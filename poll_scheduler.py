@@ -0,0 +1,210 @@
+from bioblend import ConnectionError
+from concurrent.futures import Future
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import (
+    Callable,
+    Set
+)
+
+
+class Backoff:
+    def __init__(self, initial: float = 1.0, factor: float = 2.0, maximum: float = 60.0, jitter: float = 0.2):
+        """
+        Initialize the Backoff class.
+
+        Args:
+            initial (float): The first delay in seconds.
+            factor (float): The factor the delay grows by after every attempt.
+            maximum (float): The upper bound for the delay in seconds.
+            jitter (float): The relative random spread applied to every delay, e.g. 0.2 for +/- 20%.
+        """
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        """
+        Return the delay before the next attempt and grow the delay for the one after.
+
+        Returns:
+            float: The delay in seconds, never larger than the maximum.
+        Example:
+            >>> backoff = Backoff(initial=1.0, factor=2.0, maximum=5.0, jitter=0.0)
+            >>> [backoff.next_delay() for _ in range(5)]
+            [1.0, 2.0, 4.0, 5.0, 5.0]
+        """
+        delay = min(self.maximum, self.initial * self.factor ** self.attempt)
+        self.attempt += 1
+        spread = delay * self.jitter
+        return min(self.maximum, max(0.0, delay + random.uniform(-spread, spread)))
+
+    def reset(self):
+        """
+        Start again with the initial delay.
+        """
+        self.attempt = 0
+
+
+class PollScheduler:
+    # Job states in which a Galaxy job is still waiting or running
+    JOB_PENDING_STATES = {"new", "queued", "running"}
+
+    # Reported instead of a Galaxy state when a watched item does not finish in time
+    DEADLINE_EXCEEDED = "deadline_exceeded"
+
+    def __init__(
+        self,
+        gi,
+        initial_interval: float = 1.0,
+        max_interval: float = 120.0,
+        factor: float = 1.5,
+        jitter: float = 0.2,
+        deadline: float | None = None,
+        health=None
+    ):
+        """
+        Initialize the PollScheduler class.
+
+        A single background thread polls every registered item, each one with its own
+        exponential backoff, until it leaves its pending states or its deadline passes.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            initial_interval (float): Delay in seconds before the first poll of a new item.
+            max_interval (float): Upper bound in seconds for the delay between two polls of one item.
+            factor (float): The factor the delay of an item grows by after every poll.
+            jitter (float): The relative random spread applied to every delay.
+            deadline (float | None): Default time in seconds after which an item is given up, None for no limit.
+            health (HealthMonitor | None): Circuit breaker the polls wait for while the server is degraded.
+        """
+        self.gi = gi
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.deadline = deadline
+        self.health = health
+
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def register(
+        self,
+        key: str,
+        probe: Callable[[], str],
+        pending_states: Set[str],
+        callback: Callable[[str, str], None] | None = None,
+        deadline: float | None = None
+    ) -> Future:
+        """
+        Register an item to be polled until it reaches a terminal state.
+
+        Args:
+            key (str): The identifier of the item, passed on to the callback.
+            probe (Callable[[], str]): Function returning the current state of the item.
+            pending_states (Set[str]): States in which the item is still polled.
+            callback (Callable[[str, str], None] | None): Called once with the key and the terminal state.
+            deadline (float | None): Time in seconds after which the item is given up, defaults to the scheduler deadline.
+
+        Returns:
+            Future: Resolves to the terminal state, or DEADLINE_EXCEEDED if the deadline passed first.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda done: self._notify(callback, key, done))
+
+        deadline = self.deadline if deadline is None else deadline
+        entry = {
+            "key": key,
+            "probe": probe,
+            "pending_states": pending_states,
+            "future": future,
+            "backoff": Backoff(initial=self.initial_interval, factor=self.factor, maximum=self.max_interval, jitter=self.jitter),
+            "deadline": time.monotonic() + deadline if deadline is not None else None,
+        }
+        # Poll a new item right away, short jobs are often done before the first delay
+        self._schedule(entry, delay=0.0)
+        return future
+
+    def watch_job(self, job_id: str, callback: Callable[[str, str], None] | None = None, deadline: float | None = None) -> Future:
+        """
+        Register a Galaxy job to be polled until it is no longer new, queued or running.
+
+        Args:
+            job_id (str): The ID of the Galaxy job.
+            callback (Callable[[str, str], None] | None): Called once with the job ID and the final state.
+            deadline (float | None): Time in seconds after which the job is given up.
+
+        Returns:
+            Future: Resolves to the final state of the job.
+        """
+        return self.register(
+            key=job_id,
+            probe=lambda: self.gi.jobs.show_job(job_id)["state"],
+            pending_states=self.JOB_PENDING_STATES,
+            callback=callback,
+            deadline=deadline
+        )
+
+    def _schedule(self, entry, delay: float):
+        with self._condition:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._counter), entry))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="poll-scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(timeout=timeout)
+                _, _, entry = heapq.heappop(self._queue)
+
+            self._poll(entry)
+
+    def _poll(self, entry):
+        future = entry["future"]
+        if future.cancelled():
+            return
+
+        try:
+            if self.health is None:
+                state = entry["probe"]()
+            else:
+                with self.health.slot():
+                    state = entry["probe"]()
+        except ConnectionError as e:
+            # Keep growing the delay during an outage instead of retrying at a fixed rate
+            print(f"Failed to connect to Galaxy while polling {entry['key']}: {e}")
+            state = None
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        if state is not None and state not in entry["pending_states"]:
+            future.set_result(state)
+            return
+
+        if entry["deadline"] is not None and time.monotonic() >= entry["deadline"]:
+            future.set_result(self.DEADLINE_EXCEEDED)
+            return
+
+        delay = entry["backoff"].next_delay()
+        if entry["deadline"] is not None:
+            delay = min(delay, max(0.0, entry["deadline"] - time.monotonic()))
+        self._schedule(entry, delay=delay)
+
+    def _notify(self, callback: Callable[[str, str], None], key: str, future: Future):
+        # Callbacks only fire for items that actually reached a terminal state
+        if not future.cancelled() and future.exception() is None:
+            callback(key, future.result())
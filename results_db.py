@@ -0,0 +1,302 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple
+)
+
+
+class ResultsDatabase:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            started_at REAL NOT NULL,
+            finished_at REAL,
+            server TEXT,
+            galaxy_version TEXT,
+            sampling TEXT
+        );
+        CREATE TABLE IF NOT EXISTS tools (
+            id INTEGER PRIMARY KEY,
+            tool_id TEXT NOT NULL,
+            version TEXT,
+            name TEXT,
+            UNIQUE (tool_id, version)
+        );
+        CREATE TABLE IF NOT EXISTS combinations (
+            tool_row INTEGER NOT NULL REFERENCES tools (id),
+            input_hash TEXT NOT NULL,
+            input TEXT NOT NULL,
+            PRIMARY KEY (tool_row, input_hash)
+        );
+        CREATE TABLE IF NOT EXISTS combination_values (
+            tool_row INTEGER NOT NULL,
+            input_hash TEXT NOT NULL,
+            param TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (tool_row, input_hash, param, value)
+        );
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            run_id INTEGER NOT NULL REFERENCES runs (id),
+            tool_row INTEGER NOT NULL REFERENCES tools (id),
+            input_hash TEXT NOT NULL,
+            job_id TEXT,
+            state TEXT NOT NULL,
+            submitted_at REAL NOT NULL,
+            finished_at REAL,
+            error_message TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_by_job_id ON jobs (job_id);
+        CREATE INDEX IF NOT EXISTS jobs_by_run_state ON jobs (run_id, state);
+        CREATE INDEX IF NOT EXISTS jobs_by_combination ON jobs (tool_row, input_hash);
+        CREATE INDEX IF NOT EXISTS values_by_param ON combination_values (param, value);
+        CREATE INDEX IF NOT EXISTS tools_by_name ON tools (name);
+    """
+
+    # Job states counted as a failure of the combination
+    FAILED_STATES = ("error", "failed", "submit_error", "deadline_exceeded")
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 5.0):
+        """
+        Initialize the ResultsDatabase class.
+
+        Runs, tools, combinations and jobs are kept in an SQLite file in WAL mode. Writes are queued
+        and executed together in one transaction once the batch is full or the flush interval passed,
+        so recording a job does not cost a disk sync.
+
+        Args:
+            path (str): The SQLite file, created if it does not exist.
+            batch_size (int): Number of queued writes after which they are executed.
+            flush_interval (float): Seconds after which queued writes are executed anyway.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.run_id: int | None = None
+        self.pending: List[Tuple[str, Tuple]] = []
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+        # The connection is shared by the submission threads, the lock serializes its use
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self.tool_rows: Dict[Tuple[str, str | None], int] = {}
+
+    def get_hash(self, entry: Any) -> str:
+        """
+        Hash the canonical JSON form of a tool input.
+
+        Args:
+            entry: The tool input.
+
+        Returns:
+            str: The sha256 of the input.
+        """
+        return hashlib.sha256(self.to_json(entry).encode()).hexdigest()
+
+    def to_json(self, entry: Any) -> str:
+        """
+        Serialize a value with sorted keys, so equal values give equal text.
+
+        Args:
+            entry: The value.
+
+        Returns:
+            str: The compact JSON text.
+        """
+        return json.dumps(entry, sort_keys=True, separators=(",", ":"), default=str)
+
+    def start_run(self, server: str, galaxy_version: str | None = None, sampling: str | None = None) -> int:
+        """
+        Record the start of a run, the jobs recorded afterwards belong to it.
+
+        Args:
+            server (str): The Galaxy server of the run.
+            galaxy_version (str | None): The version reported by the server.
+            sampling (str | None): The sampling strategy of the run.
+
+        Returns:
+            int: The ID of the run.
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started_at, server, galaxy_version, sampling) VALUES (?, ?, ?, ?)",
+                (time.time(), server, galaxy_version, sampling)
+            )
+            self.connection.commit()
+            self.run_id = cursor.lastrowid
+            return self.run_id
+
+    def finish_run(self):
+        """
+        Record the end of the current run and write all queued changes.
+        """
+        if self.run_id is not None:
+            self.queue("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), self.run_id))
+        self.flush()
+
+    def get_tool(self, tool_id: str, version: str | None, name: str | None) -> int:
+        """
+        Return the row of a tool version, inserting it if it is new.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+            name (str | None): The name of the tool.
+
+        Returns:
+            int: The row ID of the tool version.
+        """
+        key = (tool_id, version)
+        with self._lock:
+            if key not in self.tool_rows:
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO tools (tool_id, version, name) VALUES (?, ?, ?)", (tool_id, version, name)
+                )
+                self.connection.commit()
+                row = self.connection.execute(
+                    "SELECT id FROM tools WHERE tool_id = ? AND version IS ?", key
+                ).fetchone()
+                self.tool_rows[key] = row[0]
+            return self.tool_rows[key]
+
+    def add_job(
+        self,
+        tool_row: int,
+        combination: Dict,
+        entry: Any,
+        job_id: str | None,
+        state: str = "queued",
+        error_message: str | None = None
+    ):
+        """
+        Queue a submitted combination and its job.
+
+        Args:
+            tool_row (int): The row of the tool version.
+            combination (dict): The database param values of the combination.
+            entry: The full tool input of the combination.
+            job_id (str | None): The Galaxy job ID, None if the submission failed.
+            state (str): The state of the job.
+            error_message (str | None): The error of a failed submission.
+        """
+        input_hash = self.get_hash(entry)
+        now = time.time()
+        self.queue(
+            "INSERT OR IGNORE INTO combinations (tool_row, input_hash, input) VALUES (?, ?, ?)",
+            (tool_row, input_hash, self.to_json(entry))
+        )
+        for param, value in combination.items():
+            # Multiple selects hold a list, every selected value is recorded on its own
+            for item in (value if isinstance(value, list) else [value]):
+                self.queue(
+                    "INSERT OR IGNORE INTO combination_values (tool_row, input_hash, param, value) VALUES (?, ?, ?, ?)",
+                    (tool_row, input_hash, param, item if isinstance(item, str) else self.to_json(item))
+                )
+        self.queue(
+            "INSERT INTO jobs (run_id, tool_row, input_hash, job_id, state, submitted_at, finished_at, error_message) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.run_id, tool_row, input_hash, job_id, state, now, None if job_id else now, error_message)
+        )
+
+    def finish_job(self, job_id: str, state: str, error_message: str | None = None):
+        """
+        Queue the final state of a job.
+
+        The job is found by its Galaxy ID alone, a job taken over by a resumed run is recorded in the
+        row of the run which submitted it.
+
+        Args:
+            job_id (str): The Galaxy job ID.
+            state (str): The final state of the job.
+            error_message (str | None): The error of a failed job.
+        """
+        self.queue(
+            "UPDATE jobs SET state = ?, finished_at = ?, error_message = ? WHERE job_id = ?",
+            (state, time.time(), error_message, job_id)
+        )
+
+    def queue(self, statement: str, parameters: Tuple):
+        """
+        Queue a write and execute the queue if it is full or old enough.
+
+        Args:
+            statement (str): The SQL statement.
+            parameters (tuple): The parameters of the statement.
+        """
+        with self._lock:
+            self.pending.append((statement, parameters))
+            due = len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Execute all queued writes in one transaction, consecutive writes of the same statement at once.
+        """
+        with self._lock:
+            pending, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+            if not pending:
+                return
+            with self.connection:
+                start = 0
+                for index in range(1, len(pending) + 1):
+                    if index == len(pending) or pending[index][0] != pending[start][0]:
+                        self.connection.executemany(pending[start][0], [parameters for _, parameters in pending[start:index]])
+                        start = index
+
+    def failed_database_values(self, tool: str, last_runs: int = 1) -> List[Tuple[str, str, int]]:
+        """
+        Return the database values of failed combinations of a tool in the most recent runs.
+
+        Args:
+            tool (str): The ID or the name of the tool.
+            last_runs (int): The number of most recent runs to look at.
+
+        Returns:
+            list: (param, value, failed jobs) tuples, the most frequent failures first.
+        Example:
+            >>> db = ResultsDatabase(":memory:")
+            >>> run = db.start_run("https://usegalaxy.eu/")
+            >>> tool = db.get_tool("humann", "3.8", "HUMAnN")
+            >>> db.add_job(tool, {"db": "chocophlan"}, {"db": "chocophlan"}, "job1")
+            >>> db.add_job(tool, {"db": "uniref"}, {"db": "uniref"}, "job2")
+            >>> db.finish_job("job1", "error", "Job has error state")
+            >>> db.finish_job("job2", "ok")
+            >>> db.failed_database_values("HUMAnN", last_runs=5)
+            [('db', 'chocophlan', 1)]
+        """
+        self.flush()
+        placeholders = ", ".join("?" for _ in self.FAILED_STATES)
+        with self._lock:
+            return self.connection.execute(
+                f"""
+                SELECT v.param, v.value, COUNT(*) AS failures
+                FROM jobs j
+                JOIN tools t ON t.id = j.tool_row
+                JOIN combination_values v ON v.tool_row = j.tool_row AND v.input_hash = j.input_hash
+                WHERE (t.tool_id = ? OR t.name = ?)
+                    AND j.state IN ({placeholders})
+                    AND j.run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)
+                GROUP BY v.param, v.value
+                ORDER BY failures DESC, v.param, v.value
+                """,
+                (tool, tool, *self.FAILED_STATES, last_runs)
+            ).fetchall()
+
+    def close(self):
+        """
+        Write all queued changes and close the database.
+        """
+        self.flush()
+        with self._lock:
+            self.connection.close()
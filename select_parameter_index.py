@@ -0,0 +1,116 @@
+from typing import (
+    Any,
+    Dict,
+    List,
+    NamedTuple,
+    Tuple
+)
+
+
+class SelectParameter(NamedTuple):
+    name: str
+    options: List
+    multiple: bool
+    path: Tuple[str, ...]
+
+
+class SelectParameterIndex:
+    # Input types whose name becomes part of the path of the params inside them
+    CONTAINER_TYPES = {"conditional", "section", "repeat"}
+
+    def __init__(self, inputs: Any):
+        """
+        Initialize the SelectParameterIndex class.
+
+        The inputs tree of a tool is walked once and every SelectToolParameter is indexed by its name,
+        so the options and database names of a param are looked up without searching the tree again.
+
+        Args:
+            inputs (dict or list): The detailed inputs of a tool, as returned by show_tool with io_details.
+        """
+        self.params: Dict[str, List[SelectParameter]] = {}
+        # Unique option values of every param, over all of its occurrences
+        self.databases: Dict[str, List] = {}
+        self.build(inputs, ())
+
+    def build(self, node: Any, path: Tuple):
+        """
+        Index every select param below a node.
+
+        Args:
+            node (dict or list): The current node of the inputs tree.
+            path (tuple): The names of the enclosing conditionals, sections and repeats.
+        """
+        if isinstance(node, dict):
+            if node.get("model_class") == "SelectToolParameter":
+                self.add(SelectParameter(
+                    name=node.get("name"),
+                    options=node.get("options", []),
+                    multiple=node.get("multiple") is True,
+                    path=path
+                ))
+            if node.get("type") in self.CONTAINER_TYPES:
+                path = path + (node.get("name", ""),)
+            for value in node.values():
+                if isinstance(value, (dict, list)):
+                    self.build(value, path)
+        elif isinstance(node, list):
+            for item in node:
+                self.build(item, path)
+
+    def add(self, param: SelectParameter):
+        """
+        Add a select param and its option values to the index.
+
+        Args:
+            param (SelectParameter): The param to add.
+        """
+        self.params.setdefault(param.name, []).append(param)
+        databases = self.databases.setdefault(param.name, [])
+        for option in param.options:
+            # Options are [label, value, selected] triples
+            if isinstance(option, (list, tuple)) and len(option) > 1 and option[1] not in databases:
+                databases.append(option[1])
+
+    def get(self, name: str) -> List[SelectParameter]:
+        """
+        Return every occurrence of a select param.
+
+        Args:
+            name (str): The name of the param.
+
+        Returns:
+            list: The occurrences of the param, in the order of the inputs tree.
+        """
+        return self.params.get(name, [])
+
+    def get_databases(self, name: str) -> List:
+        """
+        Return the unique option values of a select param.
+
+        Args:
+            name (str): The name of the param.
+
+        Returns:
+            list: The option values, an empty list for unknown params.
+        Example:
+            >>> inputs = [{'type': 'conditional', 'name': 'db', 'cases': [{'inputs': [
+            ...     {'model_class': 'SelectToolParameter', 'name': 'index', 'multiple': True,
+            ...      'options': [['Human', 'hg38', False], ['Mouse', 'mm10', False]]}]}]}]
+            >>> index = SelectParameterIndex(inputs)
+            >>> index.get_databases('index'), index.get('index')[0].path, index.is_multiple('index')
+            (['hg38', 'mm10'], ('db',), True)
+        """
+        return self.databases.get(name, [])
+
+    def is_multiple(self, name: str) -> bool:
+        """
+        Check whether any occurrence of a select param accepts multiple values.
+
+        Args:
+            name (str): The name of the param.
+
+        Returns:
+            bool: True if the param is a multiple select.
+        """
+        return any(param.multiple for param in self.get(name))
@@ -0,0 +1,179 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import threading
+from typing import (
+    Callable,
+    Dict,
+    List
+)
+
+
+class SubmissionPool:
+    # Concurrency caps shared by every pool talking to the same server
+    _server_limits: Dict[str, threading.BoundedSemaphore] = {}
+    _server_limits_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        server: str | None = None,
+        max_per_server: int = 4,
+        max_queued: int | None = None,
+        health=None
+    ):
+        """
+        Initialize the SubmissionPool class.
+
+        Tasks run on a bounded thread pool and are grouped in named batches, so all tasks of one
+        tool can be joined or cancelled together.
+
+        Args:
+            max_workers (int): Maximum number of threads running tasks of this pool.
+            server (str | None): The Galaxy server the tasks talk to, None for no per-server cap.
+            max_per_server (int): Maximum number of tasks running against the server across all pools.
+            max_queued (int | None): Maximum number of unfinished tasks, submit() blocks while it is reached.
+                None for no limit.
+            health (HealthMonitor | None): Circuit breaker the tasks wait for while the server is degraded,
+                None to run them regardless.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.queue_slots = threading.BoundedSemaphore(max_queued) if max_queued else None
+        self.server_limit = self.get_server_limit(server, max_per_server) if server else None
+        self.health = health
+        self.batches: Dict[str, List[Future]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_server_limit(cls, server: str, max_per_server: int) -> threading.BoundedSemaphore:
+        """
+        Return the semaphore capping the concurrent requests against a server.
+
+        The first pool created for a server decides the cap, later pools share the same semaphore.
+
+        Args:
+            server (str): The URL of the server.
+            max_per_server (int): Maximum number of concurrent tasks against the server.
+
+        Returns:
+            threading.BoundedSemaphore: The semaphore of the server.
+        """
+        with cls._server_limits_lock:
+            if server not in cls._server_limits:
+                cls._server_limits[server] = threading.BoundedSemaphore(max_per_server)
+            return cls._server_limits[server]
+
+    def submit(self, batch: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Schedule a task as part of a batch.
+
+        If the pool has a queue limit, this waits until one of the unfinished tasks is done, so
+        lazily generated tasks are only produced as fast as they are processed.
+
+        Args:
+            batch (str): The name of the batch, e.g. the tool ID.
+            fn (Callable): The function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Future: The future of the task.
+        """
+        if self.queue_slots is not None:
+            self.queue_slots.acquire()
+        future = self.executor.submit(self._run, fn, *args, **kwargs)
+        if self.queue_slots is not None:
+            future.add_done_callback(lambda _: self.queue_slots.release())
+        with self._lock:
+            self.batches.setdefault(batch, []).append(future)
+        return future
+
+    def _run(self, fn: Callable, *args, **kwargs):
+        if self.server_limit is None:
+            return self._run_gated(fn, *args, **kwargs)
+        with self.server_limit:
+            return self._run_gated(fn, *args, **kwargs)
+
+    def _run_gated(self, fn: Callable, *args, **kwargs):
+        if self.health is None:
+            return fn(*args, **kwargs)
+        with self.health.slot():
+            return fn(*args, **kwargs)
+
+    def get_futures(self, batch: str | None = None) -> List[Future]:
+        """
+        Return the futures of one batch, or of all batches if no batch is given.
+
+        Args:
+            batch (str | None): The name of the batch.
+
+        Returns:
+            list: The futures of the selected tasks.
+        """
+        with self._lock:
+            if batch is not None:
+                return list(self.batches.get(batch, []))
+            return [future for futures in self.batches.values() for future in futures]
+
+    def on_batch_done(self, batch: str, callback: Callable[[], None]):
+        """
+        Call a function once every task submitted to a batch so far has finished or was cancelled.
+
+        Args:
+            batch (str): The name of the batch.
+            callback (Callable[[], None]): The function to call.
+        """
+        futures = self.get_futures(batch)
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def count_down(_):
+            with lock:
+                remaining[0] -= 1
+                done = remaining[0] == 0
+            if done:
+                callback()
+
+        if not futures:
+            callback()
+        for future in futures:
+            future.add_done_callback(count_down)
+
+    def join(self, batch: str | None = None) -> List[Future]:
+        """
+        Wait until every task of one batch, or of all batches, has finished.
+
+        Tasks submitted by running tasks are waited for as well.
+
+        Args:
+            batch (str | None): The name of the batch.
+
+        Returns:
+            list: The futures of the joined tasks.
+        """
+        futures = self.get_futures(batch)
+        while True:
+            wait(futures)
+            current = self.get_futures(batch)
+            if len(current) == len(futures):
+                return current
+            futures = current
+
+    def cancel(self, batch: str | None = None) -> int:
+        """
+        Cancel every task of one batch, or of all batches, which did not start yet.
+
+        Args:
+            batch (str | None): The name of the batch.
+
+        Returns:
+            int: The number of cancelled tasks.
+        """
+        return sum(future.cancel() for future in self.get_futures(batch))
+
+    def shutdown(self, cancel_pending: bool = False):
+        """
+        Stop the pool after the running tasks finished.
+
+        Args:
+            cancel_pending (bool): Whether tasks that did not start yet are cancelled instead of run.
+        """
+        self.executor.shutdown(wait=True, cancel_futures=cancel_pending)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+from typing import (
+    Any,
+    Dict,
+    NamedTuple
+)
+
+
+class ToolMetadata(NamedTuple):
+    tool_id: str
+    version: str
+    name: str
+    inputs: Any
+    link: str
+
+
+class ToolMetadataCache:
+    def __init__(self, gi, server: str, cache_dir: str | None = None):
+        """
+        Initialize the ToolMetadataCache class.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            server (str): The URL of the Galaxy server, used for the raw tool source link.
+            cache_dir (str | None): Folder for the on-disk store, None to keep the metadata in memory only.
+        """
+        self.gi = gi
+        self.server = server
+        self.cache_dir = cache_dir
+        self.tools: Dict[tuple, ToolMetadata] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tool_id: str, version: str | None = None) -> ToolMetadata:
+        """
+        Return the metadata of a tool, fetching it from Galaxy only if it is not cached yet.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool, None if the tool ID already pins it.
+
+        Returns:
+            ToolMetadata: The name, inputs tree, raw tool source link and version of the tool.
+        """
+        key = (tool_id, version)
+        with self._lock:
+            if key in self.tools:
+                return self.tools[key]
+
+        metadata = self.load(tool_id, version)
+        if metadata is None:
+            metadata = self.fetch(tool_id)
+            self.store(metadata, tool_id, version)
+
+        with self._lock:
+            self.tools[key] = metadata
+        return metadata
+
+    def fetch(self, tool_id: str) -> ToolMetadata:
+        """
+        Fetch the metadata of a tool with one show_tool request.
+
+        Args:
+            tool_id (str): The ID of the tool.
+
+        Returns:
+            ToolMetadata: The metadata of the tool.
+        """
+        tool_details = self.gi.tools.show_tool(tool_id=tool_id, io_details=True, link_details=True)
+        full_tool_id = tool_details.get("id", tool_id)
+        return ToolMetadata(
+            tool_id=full_tool_id,
+            version=tool_details.get("version", ""),
+            name=tool_details.get("name", {}),
+            inputs=tool_details.get("inputs", {}),
+            link=f'{self.server}api/tools/{full_tool_id}/raw_tool_source'
+        )
+
+    def get_cache_path(self, tool_id: str, version: str | None) -> str:
+        """
+        Return the path of the on-disk entry of a tool on this server.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+
+        Returns:
+            str: The path of the JSON file holding the metadata.
+        """
+        key = hashlib.sha256(f"{self.server}|{tool_id}|{version}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, tool_id: str, version: str | None) -> ToolMetadata | None:
+        """
+        Load the metadata of a tool from the on-disk store.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+
+        Returns:
+            ToolMetadata | None: The stored metadata, or None if there is no usable entry.
+        """
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.get_cache_path(tool_id, version), 'r') as file:
+                return ToolMetadata(**json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def store(self, metadata: ToolMetadata, tool_id: str, version: str | None):
+        """
+        Write the metadata of a tool to the on-disk store.
+
+        The metadata is always stored under the full tool ID and the version Galaxy returned. The
+        requested key is only stored as well if it pins the version, otherwise a tool update on the
+        server would be hidden by the stored entry.
+
+        Args:
+            metadata (ToolMetadata): The metadata to store.
+            tool_id (str): The tool ID the metadata was requested with.
+            version (str | None): The version the metadata was requested with.
+        """
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        keys = {(metadata.tool_id, metadata.version)}
+        if version is not None or tool_id.endswith(f"/{metadata.version}"):
+            keys.add((tool_id, version))
+        for key_tool_id, key_version in keys:
+            path = self.get_cache_path(key_tool_id, key_version)
+            # Write to a temporary file first, so a crash never leaves a half written entry
+            with open(f"{path}.tmp", 'w') as file:
+                json.dump(metadata._asdict(), file)
+            os.replace(f"{path}.tmp", path)
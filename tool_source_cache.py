@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from typing import Dict
+
+
+class ToolSourceCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, session: requests.Session | None = None):
+        """
+        Initialize the ToolSourceCache class.
+
+        Tool sources are stored content-addressed under their sha256, an index maps every tool ID and
+        version to its source together with the validators needed for conditional requests.
+
+        Args:
+            cache_dir (str): Folder holding the index and the stored tool sources.
+            max_bytes (int): Size of all stored tool sources after which the least recently used are evicted.
+            session (requests.Session | None): Session used for the downloads, None for plain requests.
+        """
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.session = session or requests
+        # Whether access times changed since the index was written
+        self.dirty = False
+        self._lock = threading.Lock()
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index: Dict[str, Dict] = self.load_index()
+
+    def load_index(self) -> Dict[str, Dict]:
+        """
+        Load the index of stored tool sources, dropping entries whose source file is gone.
+
+        Returns:
+            dict: Index entries keyed by tool ID and version.
+        """
+        try:
+            with open(self.index_path, 'r') as file:
+                index = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {key: entry for key, entry in index.items() if os.path.exists(self.get_object_path(entry["sha256"]))}
+
+    def save_index(self):
+        """
+        Write the index atomically, so a crash never leaves a half written file. Must be called with the lock held.
+        """
+        with open(f"{self.index_path}.tmp", 'w') as file:
+            json.dump(self.index, file)
+        os.replace(f"{self.index_path}.tmp", self.index_path)
+        self.dirty = False
+
+    def flush(self):
+        """
+        Write the access times of the cache hits, if any, e.g. at the end of a run.
+        """
+        with self._lock:
+            if self.dirty:
+                self.save_index()
+
+    def get_object_path(self, digest: str) -> str:
+        """
+        Return the path of a stored tool source.
+
+        Args:
+            digest (str): The sha256 of the tool source.
+
+        Returns:
+            str: The path of the file.
+        """
+        return os.path.join(self.objects_dir, digest)
+
+    def read_object(self, entry: Dict) -> bytes:
+        """
+        Read the stored tool source of an index entry.
+
+        Args:
+            entry (dict): The index entry.
+
+        Returns:
+            bytes: The tool source.
+        """
+        with open(self.get_object_path(entry["sha256"]), 'rb') as file:
+            return file.read()
+
+    def fetch(self, url: str, tool_id: str, version: str | None = None, revalidate: bool = False) -> bytes:
+        """
+        Return the source of a tool, downloading it only if no valid copy is stored.
+
+        A stored source of a known tool version is returned without any request, since a tool version
+        never changes its source. Without a version, or when revalidation is asked for, a conditional
+        request with the stored ETag and Last-Modified is made and the body is only downloaded if it changed.
+
+        Args:
+            url (str): The raw tool source URL.
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+            revalidate (bool): Whether to check a stored source of a known version with the server as well.
+
+        Returns:
+            bytes: The tool source.
+
+        Raises:
+            requests.exceptions.RequestException: If the download fails and no stored copy exists.
+        """
+        key = self.get_key(tool_id, version)
+        if not revalidate:
+            content = self.get_stored(tool_id=tool_id, version=version)
+            if content is not None:
+                return content
+
+        with self._lock:
+            entry = self.index.get(key)
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = self.session.get(url, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                self.touch(key)
+                return self.read_object(entry)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            # An outdated copy is still better than no tool source at all
+            if entry is not None:
+                return self.read_object(entry)
+            raise
+
+        self.store(key, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.content
+
+    def get_key(self, tool_id: str, version: str | None) -> str:
+        """
+        Return the index key of a tool version.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+
+        Returns:
+            str: The index key.
+        """
+        return f"{tool_id}|{version}"
+
+    def get_stored(self, tool_id: str, version: str | None) -> bytes | None:
+        """
+        Return the stored source of a known tool version without any request.
+
+        Args:
+            tool_id (str): The ID of the tool.
+            version (str | None): The version of the tool.
+
+        Returns:
+            bytes | None: The tool source, None if it must be downloaded or revalidated.
+        """
+        key = self.get_key(tool_id, version)
+        with self._lock:
+            entry = self.index.get(key)
+        if entry is None or not version:
+            return None
+        self.touch(key)
+        return self.read_object(entry)
+
+    def touch(self, key: str):
+        """
+        Mark an entry as recently used.
+
+        The index is only written with the next stored source or by flush(), so a cache hit stays a read.
+
+        Args:
+            key (str): The index key of the entry.
+        """
+        with self._lock:
+            if key in self.index:
+                self.index[key]["last_access"] = time.time()
+                self.dirty = True
+
+    def store(self, key: str, content: bytes, etag: str | None, last_modified: str | None):
+        """
+        Store a downloaded tool source and evict the least recently used sources above the size limit.
+
+        Args:
+            key (str): The index key of the tool.
+            content (bytes): The tool source.
+            etag (str | None): The ETag header of the response.
+            last_modified (str | None): The Last-Modified header of the response.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.get_object_path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                with open(f"{path}.tmp", 'wb') as file:
+                    file.write(content)
+                os.replace(f"{path}.tmp", path)
+
+            self.index[key] = {
+                "sha256": digest,
+                "size": len(content),
+                "etag": etag,
+                "last_modified": last_modified,
+                "last_access": time.time(),
+            }
+            self.evict()
+            self.save_index()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the stored sources fit into the size limit.
+
+        Sources shared by several entries are only deleted once no entry refers to them anymore.
+        Must be called with the lock held.
+        """
+        sizes = {entry["sha256"]: entry["size"] for entry in self.index.values()}
+        total = sum(sizes.values())
+
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes or len(self.index) == 1:
+                break
+            del self.index[key]
+            if all(other["sha256"] != entry["sha256"] for other in self.index.values()):
+                total -= entry["size"]
+                os.remove(self.get_object_path(entry["sha256"]))
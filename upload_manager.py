@@ -0,0 +1,151 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from chunked_uploader import ChunkedUploader
+from poll_scheduler import PollScheduler
+from typing import (
+    Dict,
+    List,
+    Tuple
+)
+
+
+class UploadManager:
+    # Dataset states of a history dataset which can stand in for an upload, an unfinished dataset, e.g. the
+    # upload of a crashed run, may still end in 'error' and is uploaded again instead
+    USABLE_STATES = {"ok"}
+
+    def __init__(
+        self,
+        gi,
+        history_id: str,
+        scheduler: PollScheduler,
+        uploader: ChunkedUploader | None = None,
+        max_workers: int = 4
+    ):
+        """
+        Initialize the UploadManager class.
+
+        Local files are matched against the datasets of the history by content hash, or by name and
+        size if Galaxy did not compute a hash, and only files without a match are uploaded.
+
+        Args:
+            gi: An instance of the Galaxy API object.
+            history_id (str): The ID of the Galaxy history.
+            scheduler (PollScheduler): The scheduler polling the upload jobs.
+            uploader (ChunkedUploader | None): The uploader sending the files, None for the default chunked uploader.
+            max_workers (int): Maximum number of files uploaded at the same time.
+        """
+        self.gi = gi
+        self.history_id = history_id
+        self.scheduler = scheduler
+        self.uploader = uploader or ChunkedUploader(gi=gi)
+        self.max_workers = max_workers
+
+    def hash_file(self, path: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Compute the sha256 of a local file.
+
+        Args:
+            path (str): The file.
+            chunk_size (int): Number of bytes read at once.
+
+        Returns:
+            str: The hex digest.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_history_datasets(self) -> List[Dict]:
+        """
+        List the datasets of the history with their name, size, state and hashes in one request.
+
+        Returns:
+            list: The dataset summaries.
+        """
+        return self.gi.histories.show_history(
+            history_id=self.history_id,
+            contents=True,
+            deleted=False,
+            visible=True,
+            types=["dataset"],
+            keys=["id", "name", "file_size", "state", "hashes"]
+        )
+
+    def find_dataset(self, datasets: List[Dict], path: str, name: str) -> str | None:
+        """
+        Find a history dataset with the content of a local file.
+
+        Args:
+            datasets (list): The dataset summaries of the history.
+            path (str): The local file.
+            name (str): The name the file gets in the history.
+
+        Returns:
+            str | None: The ID of the matching dataset, None if the file has to be uploaded.
+        Example:
+            >>> import tempfile
+            >>> path = os.path.join(tempfile.mkdtemp(), "reads")
+            >>> with open(path, 'w') as file:
+            ...     _ = file.write("ACGT")
+            >>> manager = UploadManager(gi=None, history_id="h", scheduler=None)
+            >>> datasets = [
+            ...     {'id': 'a', 'name': 'other', 'file_size': 4, 'state': 'ok', 'hashes': [
+            ...         {'hash_function': 'SHA-256', 'hash_value': manager.hash_file(path)}]},
+            ...     {'id': 'b', 'name': 'reads', 'file_size': 4, 'state': 'ok', 'hashes': []}
+            ... ]
+            >>> manager.find_dataset(datasets, path, 'reads'), manager.find_dataset(datasets[1:], path, 'reads')
+            ('a', 'b')
+            >>> manager.find_dataset(datasets[1:], path, 'forward')
+            >>> manager.find_dataset([dict(datasets[1], state='running')], path, 'reads')
+        """
+        usable = [dataset for dataset in datasets if dataset.get("state") in self.USABLE_STATES]
+        file_hash = self.hash_file(path)
+        for dataset in usable:
+            for dataset_hash in dataset.get("hashes") or []:
+                if dataset_hash.get("hash_function") == "SHA-256" and dataset_hash.get("hash_value") == file_hash:
+                    return dataset["id"]
+
+        # Galaxy only stores hashes on request, fall back to name and size
+        size = os.path.getsize(path)
+        for dataset in usable:
+            if dataset.get("name") == name and dataset.get("file_size") == size:
+                return dataset["id"]
+        return None
+
+    def upload_files(self, files: List[Tuple[str, str]]) -> List[str]:
+        """
+        Make local files available in the history, uploading only those which are not there yet.
+
+        Missing files are uploaded at the same time and all upload jobs are awaited together.
+
+        Args:
+            files (list): The local path and the dataset name of every file.
+
+        Returns:
+            list: The dataset IDs, in the order of the files.
+        """
+        datasets = self.get_history_datasets()
+        dataset_ids = [self.find_dataset(datasets, path, name) for path, name in files]
+        for (path, name), dataset_id in zip(files, dataset_ids):
+            if dataset_id is not None:
+                print(f"Reusing dataset {dataset_id} for {path}")
+
+        missing = [index for index, dataset_id in enumerate(dataset_ids) if dataset_id is None]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            uploads = {
+                index: executor.submit(
+                    self.uploader.upload, path=files[index][0], history_id=self.history_id, file_name=files[index][1]
+                )
+                for index in missing
+            }
+            jobs = {index: upload.result() for index, upload in uploads.items()}
+
+        # One wait for all upload jobs
+        wait([self.scheduler.watch_job(job["jobs"][0]["id"]) for job in jobs.values()])
+        for index, job in jobs.items():
+            dataset_ids[index] = job["outputs"][0]["id"]
+        return dataset_ids
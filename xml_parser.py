@@ -1,32 +1,131 @@
+import io
 import xml.etree.ElementTree as ET
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Tuple
+)
+
+
+class DataTableParam(NamedTuple):
+    name: str
+    table: str
+    multiple: bool
+    path: Tuple[str, ...]
 
 
 class XMLParser:
+    # Elements whose name becomes part of the path of the params inside them
+    CONTAINER_TAGS = {"conditional", "section", "repeat"}
+
     def __init__(self):
         """
         Initialize the XMLParser class.
         """
-        self.root = None
+        self.data_table_params: List[DataTableParam] = []
+        # Params grouped by the data table they are backed by
+        self.data_table_index: Dict[str, List[DataTableParam]] = {}
 
     def fetch_xml_data(self, xml_content):
         """
-        Parse XML content and set the root element.
+        Parse XML content and collect the params backed by a data table.
 
         Args:
-            xml_content (str): The XML content to be parsed.
+            xml_content (bytes or str): The XML content to be parsed.
 
         Returns:
             None
         """
-        xml_string = xml_content
-        print(type(xml_string))
+        self.data_table_params = []
+        if xml_content is not None:
+            # Parse the XML content
+            try:
+                self.data_table_params = self.analyze_tool_source(xml_content)
+            except ET.ParseError as e:
+                print(f"Error parsing XML: {e}")
+        self.data_table_index = self.build_data_table_index(self.data_table_params)
+
+    def build_data_table_index(self, params: List[DataTableParam]) -> Dict[str, List[DataTableParam]]:
+        """
+        Group data table backed params by their data table in a single traversal.
+
+        A param which appears more than once with the same path, e.g. from an expanded macro, is kept once.
+
+        Args:
+            params (list): The params collected from the tool source.
+
+        Returns:
+            dict: The params of every data table, in the order of the tool source.
+        Example:
+            >>> params = [
+            ...     DataTableParam('index', 'bowtie2_indexes', False, ('db',)),
+            ...     DataTableParam('index', 'bowtie2_indexes', False, ('db',)),
+            ...     DataTableParam('ref', 'all_fasta', False, ())
+            ... ]
+            >>> index = XMLParser().build_data_table_index(params)
+            >>> {table: [param.name for param in table_params] for table, table_params in index.items()}
+            {'bowtie2_indexes': ['index'], 'all_fasta': ['ref']}
+        """
+        index = {}
+        for param in params:
+            table_params = index.setdefault(param.table, [])
+            if param not in table_params:
+                table_params.append(param)
+        return index
 
-        # Parse the XML string
-        try:
-            self.root = ET.fromstring(xml_string)
-        except ET.ParseError as e:
-            print(f"Error parsing XML: {e}")
-            self.root = None
+    def analyze_tool_source(self, xml_content) -> List[DataTableParam]:
+        """
+        Find all params with a 'from_data_table' option in a single streaming pass over the tool source.
+
+        Elements are discarded as soon as they are closed, so no tree of the whole tool is kept in memory.
+
+        Args:
+            xml_content (bytes or str): The raw tool XML.
+
+        Returns:
+            list: A DataTableParam with name, data table, multiple flag and the enclosing
+            conditional, section and repeat names for every matching param.
+        Example:
+            >>> xml = b'''<tool><inputs><conditional name="db">
+            ...     <param name="select" type="select"/>
+            ...     <when value="cached"><param name="index" type="select" multiple="true">
+            ...         <options from_data_table="bowtie2_indexes"/></param></when>
+            ... </conditional></inputs></tool>'''
+            >>> XMLParser().analyze_tool_source(xml)
+            [DataTableParam(name='index', table='bowtie2_indexes', multiple=True, path=('db',))]
+        """
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode()
+
+        params = []
+        path = []
+        param_stack = []
+
+        for event, element in ET.iterparse(io.BytesIO(xml_content), events=("start", "end")):
+            if event == "start":
+                if element.tag in self.CONTAINER_TAGS:
+                    path.append(element.get("name", ""))
+                elif element.tag == "param":
+                    param_stack.append(element)
+                elif element.tag == "options" and param_stack and element.get("from_data_table"):
+                    param = param_stack[-1]
+                    params.append(DataTableParam(
+                        name=param.get("name"),
+                        table=element.get("from_data_table"),
+                        multiple=param.get("multiple", "false").lower() == "true",
+                        path=tuple(path)
+                    ))
+            else:
+                if element.tag in self.CONTAINER_TAGS:
+                    path.pop()
+                elif element.tag == "param":
+                    param_stack.pop()
+                # Free the finished element, only the collected params are kept
+                element.clear()
+
+        return params
 
     def find_databases_names(self, database_name):
         """
@@ -38,19 +137,29 @@ class XMLParser:
         Returns:
             list: A list of param element names matching the specified 'from_data_table' value.
         """
-        options_list = []
-        if self.root is not None:
-            try:
-                # XPath expression to find all param elements with a specific from_data_table value
-                param_elements = self.root.findall(".//param")
-                # Iterate through param elements
-                for param_element in param_elements:
-                    # Check if the param has the correct from_data_table attribute
-                    options_element = param_element.find('options')
-                    if options_element is not None:
-                        from_data_table_value = options_element.get('from_data_table')
-                        if from_data_table_value == database_name:
-                            options_list.append(param_element.get("name"))
-            except Exception as e:
-                print(f"Error: {e}")
-        return options_list
+        return self.find_databases_names_for([database_name])
+
+    def find_databases_names_for(self, database_names: Iterable[str]):
+        """
+        Find the names of all params backed by any of the given data tables at once.
+
+        Only the data tables used by the tool are looked at, so the cost does not depend on the
+        number of data tables asked for.
+
+        Args:
+            database_names (Iterable[str]): The data table names to match.
+
+        Returns:
+            list: The unique param names in the order of the tool source.
+        """
+        database_names = set(database_names)
+        names = []
+        seen = set()
+        for table, params in self.data_table_index.items():
+            if table not in database_names:
+                continue
+            for param in params:
+                if param.name not in seen:
+                    seen.add(param.name)
+                    names.append(param.name)
+        return names